@@ -1,10 +1,16 @@
 import os
 import json
+import time
+import uuid
+from typing import Optional
 import streamlit as st
 from dotenv import load_dotenv
 
-from src.graph import run_survey_graph, run_human_revision
-from src.render import extract_codebook, count_questions, generate_survey_docx
+from src.jobs import get_runner, SURVEY, REVISION, TRANSLATION, QUEUED, DONE, FAILED
+from src.render import extract_codebook, extract_multilingual_codebook, count_questions, generate_survey_docx
+from src.translate import LANGUAGES, SOURCE_LANGUAGE
+from src.versions import get_store, record_version, summarize_diff
+from src import corpus
 
 import streamlit as st
 
@@ -26,6 +32,52 @@ if "survey_state" not in st.session_state:
 if "review_phase" not in st.session_state:
     st.session_state.review_phase = False
 
+#owner id + running job live in the URL too, so a reconnected browser picks the job back up
+if "owner_id" not in st.session_state:
+    st.session_state.owner_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.owner_id
+if "job_id" not in st.session_state:
+    st.session_state.job_id = st.query_params.get("job")
+if "last_diff" not in st.session_state:
+    st.session_state.last_diff = None
+
+NODE_LABELS = {
+    "prepare_brief": "Preparing brief",
+    "planner": "Planning blueprint",
+    "generator": "Writing questions",
+    "qa": "QA review",
+    "revise": "Revising after QA",
+    "human_revise": "Applying your notes",
+    "translate": "Translating",
+}
+
+def start_job(kind: str, params: dict) -> None:
+    try:
+        job_id = get_runner().submit(st.session_state.owner_id, kind, params)
+    except Exception as e:
+        st.error(str(e))
+        st.stop()
+    st.session_state.job_id = job_id
+    st.query_params["job"] = job_id
+    st.rerun()
+
+#versions are saved by the job (or the rollback) - this only shows what changed against the previous one
+def show_diff(state: dict, previous: Optional[int]) -> None:
+    if previous and state.get("project_id") and previous != state.get("version"):
+        st.session_state.last_diff = get_store().diff(state["project_id"], previous, state["version"])
+    else:
+        st.session_state.last_diff = None
+
+#Word files are only built when asked for, and cached by survey content so reruns (and polling) don't rebuild them
+@st.cache_data(max_entries=32, show_spinner=False)
+def survey_docx(survey_json: str) -> bytes:
+    return generate_survey_docx(json.loads(survey_json))
+
+def clear_job() -> None:
+    st.session_state.job_id = None
+    if "job" in st.query_params:
+        del st.query_params["job"]
+
 ######## SIDEBAR - CONFIGURATION ##########
 with st.sidebar:
     st.header("Configuration")
@@ -34,22 +86,59 @@ with st.sidebar:
 
     max_questions = st.slider("Max questions", min_value=5, max_value=60, value=default_max_q, step=1)
     min_questions = max(max_questions - 5, int(max_questions * 0.8))
+
+    default_langs = [x.strip() for x in os.getenv("DEFAULT_LANGUAGES", "fr").split(",") if x.strip() in LANGUAGES]
+    languages = st.multiselect(
+        "Translate into",
+        options=list(LANGUAGES),
+        default=default_langs,
+        format_func=lambda code: LANGUAGES[code],
+        help="Language variants are produced once QA passes.",
+    )
+    raw_brief_for_planner = st.checkbox(
+        "Planner reads the full brief",
+        value=True,
+        help="Long briefs are condensed into a requirements digest for the writer and QA. "
+             "Untick to use the digest for the planner too.",
+    )
    
+    show_analytics = st.checkbox("Show corpus analytics", value=False)
+
     st.divider()
     if st.button("Start New Survey", use_container_width=True):
         st.session_state.survey_state = None
         st.session_state.review_phase = False
+        st.session_state.last_diff = None
+        clear_job()
         st.rerun()
 
+######## CORPUS ANALYTICS ##########
+if show_analytics:
+    st.header("Corpus analytics")
+    try:
+        col_a, col_b = st.columns(2)
+        col_a.write("**Most measured topics**")
+        col_a.dataframe(corpus.topic_counts(), use_container_width=True, hide_index=True)
+        col_b.write("**Average length by audience**")
+        col_b.dataframe(corpus.avg_length_by_audience(), use_container_width=True, hide_index=True)
+        col_a.write("**Most frequent QA issues**")
+        col_a.dataframe(corpus.qa_issue_frequency(), use_container_width=True, hide_index=True)
+        col_b.write("**Revise iterations per run**")
+        col_b.dataframe(corpus.iteration_distribution(), use_container_width=True, hide_index=True)
+    except Exception as e:
+        st.error(f"Corpus analytics unavailable: {e}")
+    st.divider()
+
 ######## INPUT FORM ##########
 project_brief = st.text_area("Project brief", height=220)
 audience = st.text_input("Target audience")
 
-if not st.session_state.review_phase:
+if not st.session_state.review_phase and not st.session_state.job_id:
     run = st.button("Generate survey", type="primary", use_container_width=True)
 else:
     run = False
-    st.info("Survey generated. Review below.")
+    if st.session_state.review_phase:
+        st.info("Survey generated. Review below.")
 
 #run 
 if run:
@@ -57,21 +146,18 @@ if run:
         st.error("Please paste a project brief first.")
         st.stop()
 
-    with st.spinner("Running agentic workflow (planner → generator → QA)..."):
-        try:
-            final_state = run_survey_graph(
-                project_brief=project_brief,
-                audience=audience,
-                max_questions=max_questions,
-                min_questions=min_questions,
-                max_iters=3,
-            )
-            st.session_state.survey_state = final_state
-            st.session_state.review_phase = True
-            st.rerun()
-        except Exception as e:
-            st.error(str(e))
-            st.stop()
+    start_job(SURVEY, {
+        "project_brief": project_brief,
+        "audience": audience,
+        "max_questions": max_questions,
+        "min_questions": min_questions,
+        "max_iters": 3,
+        "languages": languages,
+        "raw_brief_for_planner": raw_brief_for_planner,
+    })
+
+#job progress goes here, filled in by the poll at the bottom of the page
+job_status = st.empty()
 
 if st.session_state.survey_state:
     final_state = st.session_state.survey_state
@@ -79,6 +165,7 @@ if st.session_state.survey_state:
     blueprint = final_state.get("blueprint", {})
     survey = final_state.get("survey", {})
     qa = final_state.get("qa", {})
+    translations = final_state.get("translations") or {}
 
     st.success("Survey generated. Please review.")
     qcount = count_questions(survey)
@@ -89,7 +176,12 @@ if st.session_state.survey_state:
     else:
         st.info(f"Questions: {qcount} (max: {max_questions})")
 
-    tab1, tab2, tab3, tab4 = st.tabs(["Blueprint", "Survey (formatted)", "Codebook", "QA report"])
+    if st.session_state.last_diff:
+        with st.expander("Changes in this revision", expanded=True):
+            for line in summarize_diff(st.session_state.last_diff) or ["No structural changes."]:
+                st.markdown(f"- {line}")
+
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Blueprint", "Survey (formatted)", "Codebook", "QA report", "Versions"])
 
     with tab1:
         st.subheader("Blueprint")
@@ -97,33 +189,58 @@ if st.session_state.survey_state:
 
     with tab2:
         st.subheader("Survey")
-        for sec in survey.get("sections", []):
+        view_lang = SOURCE_LANGUAGE
+        if translations:
+            view_lang = st.radio(
+                "Language",
+                [SOURCE_LANGUAGE, *translations],
+                format_func=lambda code: LANGUAGES.get(code, "English"),
+                horizontal=True,
+            )
+        elif final_state.get("languages") and not final_state.get("translation_errors"):
+            st.caption("Translations are produced once QA passes, or when you approve the survey.")
+        for lang, error in (final_state.get("translation_errors") or {}).items():
+            st.warning(f"{LANGUAGES.get(lang, lang)} translation failed: {error}")
+        shown = translations.get(view_lang, survey)
+        for sec in shown.get("sections", []):
             st.markdown(f"## {sec.get('title')}")
             for q in sec.get("questions", []):
                 st.markdown(f"**{q.get('id')}** — {q.get('text')}")
                 qtype = q.get("type")
                 opts = q.get("options") or []
                 if qtype in ("single_choice", "likert_5", "likert_7"):
-                    st.radio("Select one:", opts, key=f"{q.get('id')}_radio", disabled=True)
+                    st.radio("Select one:", opts, key=f"{view_lang}_{q.get('id')}_radio", disabled=True)
                 elif qtype == "multi_choice":
                     st.write("Select all that apply:")
                     for opt in opts:
-                        st.checkbox(opt, key=f"{q.get('id')}_{opt}", disabled=True)
+                        st.checkbox(opt, key=f"{view_lang}_{q.get('id')}_{opt}", disabled=True)
                 elif qtype == "free_text":
-                    st.text_area("Your answer:", key=f"{q.get('id')}_text", disabled=True, height=80)
+                    st.text_area("Your answer:", key=f"{view_lang}_{q.get('id')}_text", disabled=True, height=80)
                 elif qtype == "numeric":
-                    st.number_input("Enter a number:", key=f"{q.get('id')}_num", disabled=True)
+                    st.number_input("Enter a number:", key=f"{view_lang}_{q.get('id')}_num", disabled=True)
                 st.markdown("---")
                 
-        st.download_button(
-            " Download as Word",
-            data=generate_survey_docx(survey),
-            file_name="survey.docx",
-            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        )
+        if st.checkbox("Prepare Word downloads", key="want_docx"):
+            st.download_button(
+                " Download as Word",
+                data=survey_docx(json.dumps(survey, sort_keys=True)),
+                file_name="survey.docx",
+                mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            )
+            for lang, variant in translations.items():
+                st.download_button(
+                    f" Download as Word ({LANGUAGES.get(lang, lang)})",
+                    data=survey_docx(json.dumps(variant, sort_keys=True)),
+                    file_name=f"survey_{lang}.docx",
+                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                    key=f"docx_{lang}",
+                )
     with tab3:
         st.subheader("Codebook")
-        codebook_df = extract_codebook(survey)
+        if translations:
+            codebook_df = extract_multilingual_codebook(survey, translations, SOURCE_LANGUAGE)
+        else:
+            codebook_df = extract_codebook(survey)
         st.dataframe(codebook_df, use_container_width=True)
         st.download_button(
             "Download codebook.csv",
@@ -134,10 +251,54 @@ if st.session_state.survey_state:
 
     with tab4:
         st.subheader("QA report")
-        st.json(qa)
-        if not qa.get("passed", False):
+        if not qa:
+            st.info("No QA report saved for this version. Submit revision notes below to run QA again.")
+        else:
+            st.json(qa)
+        if qa and not qa.get("passed", False):
             st.warning("QA did not fully pass. Review issues above or provide revision notes below.")
 
+        trace = final_state.get("trace") or []
+        if trace:
+            hedged = sum(1 for t in trace if t.get("hedged"))
+            total = sum(t.get("latency") or 0 for t in trace)
+            st.caption(f"LLM calls: {len(trace)} | hedged: {hedged} | total call time: {total:.0f}s")
+            with st.expander("Call trace"):
+                st.dataframe(trace, use_container_width=True)
+
+    with tab5:
+        st.subheader("Versions")
+        project_id = final_state.get("project_id")
+        history = get_store().history(project_id) if project_id else []
+        if not history:
+            st.write("No saved versions yet.")
+        else:
+            st.dataframe(
+                [{"version": h["version"], "note": h["note"]} for h in history],
+                use_container_width=True,
+                hide_index=True,
+            )
+            numbers = [h["version"] for h in history]
+            col_old, col_new = st.columns(2)
+            old_v = col_old.selectbox("Compare version", numbers, index=max(len(numbers) - 2, 0))
+            new_v = col_new.selectbox("with version", numbers, index=len(numbers) - 1)
+            for line in summarize_diff(get_store().diff(project_id, old_v, new_v)) or ["No structural changes."]:
+                st.markdown(f"- {line}")
+
+            if old_v != final_state.get("version") and st.button(f"Roll back to version {old_v}"):
+                #a rollback is saved as a new version, so it can be undone too
+                #the QA report comes back with the survey it was made for (empty for versions saved without one)
+                restored = {
+                    **final_state,
+                    "survey": get_store().checkout(project_id, old_v),
+                    "qa": get_store().qa_report(project_id, old_v) or {},
+                    "translations": {},
+                    "translation_errors": {},
+                }
+                show_diff(restored, record_version(restored, f"Rolled back to version {old_v}"))
+                st.session_state.survey_state = restored
+                st.rerun()
+
     st.divider()
     st.subheader("Human Review")
     
@@ -146,6 +307,9 @@ if st.session_state.survey_state:
     with col_approve:
         st.write("**Happy with the survey?**")
         if st.button("Approve & Finish", type="primary", use_container_width=True):
+            #QA may not have passed (so nothing was translated) - the approved survey still gets its languages
+            if any(lang not in translations for lang in languages if lang != SOURCE_LANGUAGE):
+                start_job(TRANSLATION, {"state": final_state, "languages": languages})
             st.balloons()
             st.success("Survey approved! Download using the buttons above.")
             st.session_state.review_phase = False
@@ -162,13 +326,38 @@ if st.session_state.survey_state:
             if not human_notes.strip():
                 st.error("Please enter your revision notes first.")
             else:
-                with st.spinner("Revising survey based on your notes..."):
-                    try:
-                        revised_state = run_human_revision(
-                            state=st.session_state.survey_state,
-                            human_notes=human_notes,
-                        )
-                        st.session_state.survey_state = revised_state
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Revision failed: {str(e)}")
+                start_job(REVISION, {
+                    "state": st.session_state.survey_state,
+                    "human_notes": human_notes,
+                })
+
+######## JOB POLLING ##########
+#the work itself runs in the job runner, not in this script
+#polled last so the current survey stays on screen while a revision runs
+if st.session_state.job_id:
+    job = get_runner().get(st.session_state.job_id)
+    if job is None:
+        clear_job()
+    elif job["status"] == DONE:
+        #the job already saved the version and the corpus row, reruns / other tabs only read it
+        source = job["params"].get("state") or {}
+        same_project = job["kind"] == REVISION and source.get("project_id") == job["result"].get("project_id")
+        show_diff(job["result"], source.get("version") if same_project else None)
+        st.session_state.survey_state = job["result"]
+        #a translation job comes from "Approve & Finish", so the review is over
+        st.session_state.review_phase = job["kind"] != TRANSLATION
+        clear_job()
+        st.rerun()
+    elif job["status"] == FAILED:
+        clear_job()
+        job_status.error(f"Workflow failed: {job['error']}")
+    else:
+        if job["node"] is None:
+            step = "Queued" if job["status"] == QUEUED else "Starting"
+        else:
+            step = NODE_LABELS.get(job["node"], job["node"])
+        if job["iteration"]:
+            step += f" (iteration {job['iteration']})"
+        job_status.info(f"Running agentic workflow (planner → generator → QA)... {step}")
+        time.sleep(1.5)
+        st.rerun()
@@ -0,0 +1,115 @@
+#startup benchmark - how long does app.py spend importing our own modules?
+#uses `python -X importtime` in a fresh interpreter, so nothing is cached from this process
+#
+#usage (from the repo root):
+#   python benchmarks/bench_startup.py               # report
+#   python benchmarks/bench_startup.py --budget-ms 150 # fail if over budget
+#
+#exits non-zero if the import budget is blown or a heavy dependency is pulled in at startup
+
+from __future__ import annotations
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP = os.path.join(ROOT, "app.py")
+
+#these should only load when a code path needs them (worker thread, export buttons)
+HEAVY_MODULES = ["langgraph", "openai", "pandas", "docx", "pydantic", "pyarrow"]
+
+
+#what app.py imports on every script run: our own modules imported at module level (not inside functions)
+#read from app.py itself, so a new import there is measured without touching this file
+def startup_modules(path: str = APP) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    def local(name: str) -> bool:
+        return os.path.isdir(os.path.join(ROOT, name.split(".")[0]))
+
+    def is_module(name: str) -> bool:
+        base = os.path.join(ROOT, *name.split("."))
+        return os.path.isfile(base + ".py") or os.path.isdir(base)
+
+    found: Dict[str, None] = {}
+    stack = list(tree.body)
+    while stack:
+        node = stack.pop(0)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        if isinstance(node, ast.Import):
+            found.update({a.name: None for a in node.names if local(a.name)})
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level and local(node.module):
+            #`from src import corpus` imports the submodule, `from src.jobs import x` the module itself
+            subs = [f"{node.module}.{a.name}" for a in node.names if is_module(f"{node.module}.{a.name}")]
+            found.update({m: None for m in subs or [node.module]})
+        else:
+            stack.extend(child for child in ast.iter_child_nodes(node) if isinstance(child, ast.stmt))
+    return list(found)
+
+class ImportFailed(Exception):
+    pass
+
+def measure(modules: List[str]) -> Tuple[Dict[str, int], List[str]]:
+    #streamlit is loaded first, app.py needs it anyway
+    code = "import streamlit\n" + "".join(f"import {m}\n" for m in modules)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        #importtime lines are noise here, the traceback is what matters
+        raise ImportFailed("\n".join(l for l in proc.stderr.splitlines() if not l.startswith("import time:")))
+    #lines look like: "import time:   self [us] | cumulative | imported package"
+    cumulative: Dict[str, int] = {}
+    loaded: List[str] = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, self_us, cum_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        cumulative[name] = int(cum_us)
+        loaded.append(name)
+    return cumulative, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="startup import benchmark")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if our startup imports take longer")
+    parser.add_argument("--repeat", type=int, default=5, help="runs to take the best of")
+    args = parser.parse_args()
+
+    modules = startup_modules()
+    best_ms = None
+    loaded: List[str] = []
+    for _ in range(args.repeat):
+        try:
+            cumulative, loaded = measure(modules)
+        except ImportFailed as e:
+            print(f"FAIL: could not import the startup modules ({', '.join(modules)}):\n{e}")
+            return 1
+        #top-level entries only - nested ones are already included in their parent's cumulative time
+        packages = sorted({m.split(".")[0] for m in modules})
+        total_us = sum(cumulative.get(m, 0) for m in modules + packages)
+        ms = total_us / 1000
+        best_ms = ms if best_ms is None else min(best_ms, ms)
+
+    print(f"startup imports ({', '.join(modules)}): {best_ms:.1f} ms (best of {args.repeat})")
+
+    heavy = sorted({m.split(".")[0] for m in loaded} & set(HEAVY_MODULES))
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if args.budget_ms is not None and best_ms > args.budget_ms:
+        print(f"FAIL: over budget ({best_ms:.1f} ms > {args.budget_ms:.1f} ms)")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#brief preparation - condenses long briefs once instead of re-sending them on every call
+#FLOW: brief --> short? use as-is
+#            --> long? chunks --> condense each chunk in parallel (map) --> merge into one digest (reduce)
+#the digest is cached by the hash of the brief + everything that shapes it (model, prompts, chunking),
+#so re-running the same RFP costs nothing
+
+from __future__ import annotations
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from .schema import BriefDigest
+from .llm import chat_json, get_setting
+from .prompts import BRIEF_CONDENSE_SYSTEM, BRIEF_CONDENSE_USER
+from .cache import get_cache, cache_key
+
+#briefs shorter than this are passed through untouched
+LONG_BRIEF_CHARS = int(get_setting("BRIEF_DIGEST_MIN_CHARS", "6000"))
+
+#target chunk size for the map step
+CHUNK_CHARS = 4000
+
+#bump when the map / merge logic changes, so old cached digests are not reused
+DIGEST_VERSION = 1
+
+#section headings used when the digest is written into a prompt
+_DIGEST_LABELS = {
+    "goals": "Goals",
+    "target_audience": "Target audience",
+    "topics": "Topics to measure",
+    "requirements": "Requirements",
+    "constraints": "Constraints",
+    "context": "Context",
+}
+
+_WORD = re.compile(r"[a-zA-ZÀ-ÿ]{4,}")
+
+
+def is_long(brief: str) -> bool:
+    return len(brief) >= LONG_BRIEF_CHARS
+
+#split on paragraphs and pack them into chunks, a single huge paragraph is cut by size
+def chunk_brief(brief: str, size: int = CHUNK_CHARS) -> List[str]:
+    chunks: List[str] = []
+    current = ""
+    for para in re.split(r"\n\s*\n", brief):
+        para = para.strip()
+        if not para:
+            continue
+        while len(para) > size:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(para[:size])
+            para = para[size:]
+        if current and len(current) + len(para) + 2 > size:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n\n{para}" if current else para
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+#---------- map / reduce
+
+#returns the partial digest and whether the response had to be repaired (cut off and closed)
+def _condense_chunk(chunk: str, part: int, total: int, trace: Optional[list]) -> Tuple[BriefDigest, bool]:
+    user = BRIEF_CONDENSE_USER.format(chunk=chunk, part=part, total=total)
+    calls: List[dict] = []
+    digest = BriefDigest.model_validate(chat_json(BRIEF_CONDENSE_SYSTEM, user, node="brief", trace=calls))
+    if trace is not None:
+        trace.extend(calls)
+    return digest, any((c.get("json_repair") or "").startswith("truncated") for c in calls)
+
+#merge partial digests in brief order, dropping repeats (case/space insensitive)
+def _merge(parts: List[BriefDigest]) -> BriefDigest:
+    merged: Dict[str, List[str]] = {field: [] for field in _DIGEST_LABELS}
+    seen: Dict[str, set] = {field: set() for field in _DIGEST_LABELS}
+    for part in parts:
+        for field in _DIGEST_LABELS:
+            for item in getattr(part, field):
+                norm = " ".join(item.lower().split())
+                if norm and norm not in seen[field]:
+                    seen[field].add(norm)
+                    merged[field].append(item.strip())
+    return BriefDigest(**merged)
+
+def _digest_key(brief: str) -> str:
+    model = get_setting("LLM_MODEL", "Qwen/Qwen2.5-72B-Instruct")
+    return cache_key(DIGEST_VERSION, model, BRIEF_CONDENSE_SYSTEM, BRIEF_CONDENSE_USER, CHUNK_CHARS, brief)
+
+def condense_brief(brief: str, chunks: List[str], trace: Optional[list] = None) -> BriefDigest:
+    cache = get_cache()
+    key = _digest_key(brief)
+    cached = cache.get("brief_digest", key)
+    if cached is not None:
+        return BriefDigest.model_validate(cached)
+
+    with ThreadPoolExecutor(max_workers=min(len(chunks), 8)) as pool:
+        results = list(pool.map(lambda a: _condense_chunk(*a), [(c, i + 1, len(chunks), trace) for i, c in enumerate(chunks)]))
+    digest = _merge([part for part, _ in results])
+    #a repaired response may have lost items - use it for this run, but don't keep it
+    if not any(repaired for _, repaired in results):
+        cache.put("brief_digest", key, digest.model_dump())
+    return digest
+
+
+#---------- what downstream prompts see
+
+def render_digest(digest: dict) -> str:
+    lines = ["Requirements digest (condensed from the full project brief):"]
+    for field, label in _DIGEST_LABELS.items():
+        items = digest.get(field) or []
+        if items:
+            lines.append(f"{label}:")
+            lines.extend(f"- {item}" for item in items)
+    return "\n".join(lines)
+
+#excerpts are a top-up to the digest, not the brief again: at most this share of the brief, and this many chars
+EXCERPT_SHARE = 0.2
+EXCERPT_MAX_CHARS = 3000
+
+#the paragraphs of the raw brief that share the most words with the query (cheap, no embeddings),
+#as many as fit in the excerpt budget
+def brief_excerpts(chunks: List[str], query: str, max_chars: Optional[int] = None) -> List[str]:
+    terms = {w.lower() for w in _WORD.findall(query)}
+    paras = [p.strip() for chunk in chunks for p in re.split(r"\n\s*\n", chunk) if p.strip()]
+    if not terms or not paras:
+        return []
+    if max_chars is None:
+        max_chars = min(EXCERPT_MAX_CHARS, int(sum(len(p) for p in paras) * EXCERPT_SHARE))
+
+    scored = []
+    for i, para in enumerate(paras):
+        score = len(terms & {w.lower() for w in _WORD.findall(para)})
+        if score:
+            scored.append((score, i))
+    picked, used = [], 0
+    for _, i in sorted(scored, key=lambda x: (-x[0], x[1])):
+        if used + len(paras[i]) <= max_chars:
+            picked.append(i)
+            used += len(paras[i])
+    #keep brief order so excerpts read naturally
+    return [paras[i] for i in sorted(picked)]
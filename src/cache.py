@@ -0,0 +1,57 @@
+#small persistent key/value cache for LLM results that only depend on their input
+#keys are content hashes, so a changed input is simply a miss
+
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Optional
+
+from .storage import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+"""
+
+#hash of any json-able value, used as the cache key
+def cache_key(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class Cache:
+    def __init__(self, db_name: str = "cache.sqlite3"):
+        self._conn = connect(db_name)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+        return json.loads(row["value"]) if row else None
+
+    def put(self, ns: str, key: str, value: Any) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (ns, key, value, updated) VALUES (?, ?, ?, ?)",
+                (ns, key, json.dumps(value), time.time()),
+            )
+            self._conn.commit()
+
+
+_cache: Optional[Cache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> Cache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = Cache()
+        return _cache
@@ -0,0 +1,347 @@
+#corpus - every final survey state, kept in a local columnar store for analytics across projects
+#FLOW: final state --> rows for runs / questions / qa_issues / calls --> parquet, partitioned by month
+#queries only read the columns and months they ask for (pyarrow dataset scan with partition pruning)
+
+from __future__ import annotations
+import glob
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from .jobs import SURVEY
+from .llm import get_setting
+from .render import codebook_rows, count_questions
+from .storage import data_path
+from .translate import SOURCE_LANGUAGE
+
+#pyarrow is only needed when writing / querying, keep it off the startup path
+if TYPE_CHECKING:
+    import pandas as pd
+    import pyarrow as pa
+
+TABLES = ("runs", "questions", "qa_issues", "calls")
+
+#a month partition is compacted into one file once it has this many
+COMPACT_AFTER = int(get_setting("CORPUS_COMPACT_AFTER", "50"))
+
+#appends come from several job threads, only one of them compacts a partition at a time
+_compact_lock = threading.Lock()
+
+
+def corpus_dir() -> str:
+    return data_path("corpus")
+
+@lru_cache(maxsize=1)
+def _schemas() -> Dict[str, pa.Schema]:
+    import pyarrow as pa
+
+    common = [("run_id", pa.string()), ("created", pa.timestamp("s", tz="UTC")), ("month", pa.string())]
+    return {
+        #one row per final state
+        "runs": pa.schema(common + [
+            ("project_id", pa.string()),
+            ("version", pa.int32()),
+            ("kind", pa.string()),
+            ("audience", pa.string()),
+            ("n_questions", pa.int32()),
+            ("n_sections", pa.int32()),
+            ("max_questions", pa.int32()),
+            ("qa_passed", pa.bool_()),
+            ("n_issues", pa.int32()),
+            ("iterations", pa.int32()),
+            ("human_revisions", pa.int32()),
+            ("languages", pa.list_(pa.string())),
+            ("goals", pa.list_(pa.string())),
+            ("topics", pa.list_(pa.string())),
+            ("blueprint_json", pa.string()),
+            ("llm_calls", pa.int32()),
+            ("hedged_calls", pa.int32()),
+            ("call_seconds", pa.float64()),
+        ]),
+        #codebook rows, one per question per language (kind / version tell revisions of a project apart)
+        "questions": pa.schema(common + [
+            ("project_id", pa.string()),
+            ("version", pa.int32()),
+            ("kind", pa.string()),
+            ("audience", pa.string()),
+            ("language", pa.string()),
+            ("question_id", pa.string()),
+            ("section", pa.string()),
+            ("text", pa.string()),
+            ("type", pa.string()),
+            ("options", pa.string()),
+            ("n_options", pa.int32()),
+            ("topic", pa.string()),
+            ("analysis_tag", pa.string()),
+            ("required", pa.bool_()),
+        ]),
+        #QA issues of the final report, issue_key groups the same kind of issue across surveys
+        "qa_issues": pa.schema(common + [
+            ("audience", pa.string()),
+            ("issue", pa.string()),
+            ("issue_key", pa.string()),
+        ]),
+        #the LLM call trace
+        "calls": pa.schema(common + [
+            ("node", pa.string()),
+            ("latency", pa.float64()),
+            ("hedged", pa.bool_()),
+            ("winner", pa.string()),
+            ("json_repair", pa.string()),
+            ("error", pa.string()),
+        ]),
+    }
+
+def _partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+#"Q7 has repeated 'Agree' in scale" --> "q# has repeated '…' in scale"
+def issue_key(issue: str) -> str:
+    key = re.sub(r"\bQ\d+[a-z]?\b", "Q#", issue, flags=re.IGNORECASE)
+    key = re.sub(r"'[^']*'|\"[^\"]*\"|“[^”]*”", "'…'", key)
+    key = re.sub(r"\d+", "#", key)
+    return " ".join(key.lower().split())
+
+
+################## WRITE #####################
+
+#trace_from: where this job's calls start - a revision carries the earlier calls in its trace
+def _rows(state: dict, kind: str, run_id: str, created: datetime, trace_from: int = 0) -> Dict[str, List[dict]]:
+    base = {"run_id": run_id, "created": created, "month": created.strftime("%Y-%m")}
+    survey = state.get("survey") or {}
+    blueprint = state.get("blueprint") or {}
+    qa = state.get("qa") or {}
+    trace = (state.get("trace") or [])[trace_from:]
+    audience = state.get("audience") or ""
+
+    questions = []
+    variants = [(SOURCE_LANGUAGE, survey)] + list((state.get("translations") or {}).items())
+    for lang, variant in variants:
+        for row in codebook_rows(variant):
+            questions.append({
+                **base, **row,
+                "project_id": state.get("project_id"),
+                "version": state.get("version"),
+                "kind": kind,
+                "audience": audience,
+                "language": lang,
+                "n_options": len(row["options"].split(" | ")) if row["options"] else 0,
+            })
+
+    return {
+        "runs": [{
+            **base,
+            "project_id": state.get("project_id"),
+            "version": state.get("version"),
+            "kind": kind,
+            "audience": audience,
+            "n_questions": count_questions(survey),
+            "n_sections": len(survey.get("sections", [])),
+            "max_questions": state.get("max_questions"),
+            "qa_passed": bool(qa.get("passed", False)),
+            "n_issues": len(qa.get("issues") or []),
+            "iterations": state.get("iter_count", 0),
+            "human_revisions": state.get("human_revision_count", 0),
+            "languages": list(state.get("languages") or []),
+            "goals": list(blueprint.get("goals") or []),
+            "topics": list(blueprint.get("topics_to_measure") or []),
+            "blueprint_json": json.dumps(blueprint),
+            "llm_calls": len(trace),
+            "hedged_calls": sum(1 for t in trace if t.get("hedged")),
+            "call_seconds": float(sum(t.get("latency") or 0 for t in trace)),
+        }],
+        "questions": questions,
+        "qa_issues": [
+            {**base, "audience": audience, "issue": issue, "issue_key": issue_key(issue)}
+            for issue in qa.get("issues") or []
+        ],
+        "calls": [
+            {
+                **base,
+                "node": t.get("node"),
+                "latency": t.get("latency"),
+                "hedged": bool(t.get("hedged")),
+                "winner": t.get("winner"),
+                "json_repair": t.get("json_repair"),
+                "error": t.get("error"),
+            }
+            for t in trace
+        ],
+    }
+
+#append one final state, returns its run id
+#each table gets one new file in its month partition, written under a "_" name (ignored by readers)
+#and renamed into place, so a reader never sees half a file
+def append_run(state: dict, kind: str, trace_from: int = 0) -> str:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    run_id = uuid.uuid4().hex
+    created = datetime.now(timezone.utc).replace(microsecond=0)
+    month = created.strftime("%Y-%m")
+    schemas = _schemas()
+    for name, rows in _rows(state, kind, run_id, created, trace_from).items():
+        if not rows:
+            continue
+        part_dir = _part_dir(name, month)
+        os.makedirs(part_dir, exist_ok=True)
+        data = pa.Table.from_pylist(rows, schema=schemas[name]).drop(["month"]) #month is the directory
+        tmp = os.path.join(part_dir, f"_{run_id}.parquet")
+        pq.write_table(data, tmp)
+        os.replace(tmp, os.path.join(part_dir, f"{run_id}.parquet"))
+        _maybe_compact(name, month)
+    return run_id
+
+def _part_dir(table: str, month: str) -> str:
+    return os.path.join(corpus_dir(), table, f"month={month}")
+
+#files of a partition readers should use: a compaction manifest ("_<id>.json") hides the files it
+#replaced as soon as its compacted file exists, so there is never a moment where rows count twice
+def _live_files(part_dir: str) -> List[str]:
+    try:
+        names = set(os.listdir(part_dir))
+    except FileNotFoundError:
+        return []
+    superseded = set()
+    for n in names:
+        if n.startswith("_") and n.endswith(".json"):
+            try:
+                with open(os.path.join(part_dir, n), encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                continue #finished and removed meanwhile, its sources are gone too
+            if manifest["compacted"] in names:
+                superseded.update(manifest["sources"])
+    return sorted(
+        os.path.join(part_dir, n) for n in names
+        if n.endswith(".parquet") and not n.startswith("_") and n not in superseded
+    )
+
+def _maybe_compact(table: str, month: str) -> None:
+    with _compact_lock:
+        if len(_live_files(_part_dir(table, month))) >= COMPACT_AFTER:
+            compact(table, month)
+
+#every run adds small files - rewrite a month of one table into a single file to keep scans fast
+#called by append_run once a partition reaches COMPACT_AFTER files
+#steps: write the new file under "_" --> manifest (new file + the files it replaces) --> rename the new
+#file into place (readers switch over here) --> delete the old files --> delete the manifest
+def compact(table: str, month: str) -> None:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    part_dir = _part_dir(table, month)
+    _cleanup(part_dir)
+    files = _live_files(part_dir)
+    if len(files) < 2:
+        return
+    schema = _schemas()[table]
+    data = ds.dataset(files, format="parquet", schema=schema.remove(schema.get_field_index("month"))).to_table()
+
+    cid = uuid.uuid4().hex
+    name = f"compacted-{cid}.parquet"
+    tmp = os.path.join(part_dir, f"_{name}")
+    pq.write_table(data, tmp)
+    manifest = os.path.join(part_dir, f"_{cid}.json")
+    with open(manifest + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"compacted": name, "sources": [os.path.basename(p) for p in files]}, f)
+    os.replace(manifest + ".tmp", manifest)
+    os.replace(tmp, os.path.join(part_dir, name))
+    for p in files:
+        os.remove(p)
+    os.remove(manifest)
+
+#finish a compaction that was interrupted after its rename: drop the replaced files and the manifest
+def _cleanup(part_dir: str) -> None:
+    for manifest in glob.glob(os.path.join(part_dir, "_*.json")):
+        with open(manifest, encoding="utf-8") as f:
+            m = json.load(f)
+        if os.path.exists(os.path.join(part_dir, m["compacted"])):
+            for n in m["sources"]:
+                if os.path.exists(os.path.join(part_dir, n)):
+                    os.remove(os.path.join(part_dir, n))
+        os.remove(manifest)
+
+
+################## QUERY #####################
+
+#read only the given columns / months of a table, `where` is a pyarrow.dataset expression
+#files are listed per month partition (see _live_files), a compaction finishing mid-read is retried
+def scan(
+    table: str,
+    columns: Optional[List[str]] = None,
+    where=None,
+    months: Optional[List[str]] = None,
+) -> pa.Table:
+    import pyarrow.dataset as ds
+
+    schema = _schemas()[table]
+    path = os.path.join(corpus_dir(), table)
+    for attempt in range(3):
+        parts = glob.glob(os.path.join(path, "month=*"))
+        if months:
+            parts = [p for p in parts if p.split("month=", 1)[1] in months]
+        files = [f for p in parts for f in _live_files(p)]
+        if not files:
+            empty = schema.empty_table()
+            return empty.select(columns) if columns else empty
+        try:
+            dataset = ds.dataset(
+                files, format="parquet", schema=schema,
+                partitioning=_partitioning(), partition_base_dir=path,
+            )
+            return dataset.to_table(columns=columns, filter=where)
+        except FileNotFoundError:
+            if attempt == 2:
+                raise
+
+#group by one column, count rows (and optionally average another), sorted by count
+def _count_by(t: pa.Table, key: str, mean_of: Optional[str] = None) -> pa.Table:
+    import pyarrow as pa
+
+    aggs = [([], "count_all")] + ([(mean_of, "mean")] if mean_of else [])
+    out = t.group_by(key).aggregate(aggs)
+    columns = {key: out[key], "count": out["count_all"]}
+    if mean_of:
+        columns[f"avg_{mean_of}"] = out[f"{mean_of}_mean"]
+    return pa.table(columns).sort_by([("count", "descending")])
+
+#most measured topics (source language only, so translations don't count twice)
+def topic_counts(top: int = 20, months: Optional[List[str]] = None) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    #first generation of each project only - revisions would count the same project again
+    where = (ds.field("language") == SOURCE_LANGUAGE) & (ds.field("kind") == SURVEY) & ds.field("topic").is_valid()
+    t = scan("questions", ["topic"], where=where, months=months)
+    return _count_by(t, "topic").slice(0, top).to_pandas()
+
+#new surveys only - a revision of the same survey would be counted again
+def avg_length_by_audience(months: Optional[List[str]] = None) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    t = scan("runs", ["audience", "n_questions"], where=ds.field("kind") == SURVEY, months=months)
+    return _count_by(t, "audience", mean_of="n_questions").to_pandas()
+
+#how often each kind of issue is still in the final QA report, as a share of all runs
+def qa_issue_frequency(top: int = 20, months: Optional[List[str]] = None) -> pd.DataFrame:
+    import pyarrow.compute as pc
+
+    runs = scan("runs", ["run_id"], months=months).num_rows
+    out = _count_by(scan("qa_issues", ["issue_key"], months=months), "issue_key").slice(0, top)
+    out = out.append_column("share_of_runs", pc.divide(pc.cast(out["count"], "float64"), float(max(runs, 1))))
+    return out.to_pandas()
+
+#QA loops of the generation workflow, so new surveys only (revisions start their own count)
+def iteration_distribution(months: Optional[List[str]] = None) -> pd.DataFrame:
+    import pyarrow.dataset as ds
+
+    out = _count_by(scan("runs", ["iterations"], where=ds.field("kind") == SURVEY, months=months), "iterations")
+    return out.sort_by([("iterations", "ascending")]).to_pandas()
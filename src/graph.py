@@ -2,17 +2,21 @@
 from __future__ import annotations
 
 import json
-from typing import TypedDict, Optional
+from functools import lru_cache
+from typing import Callable, Dict, List, TypedDict, Optional
 
-from langgraph.graph import StateGraph, END
-
-from .schema import Blueprint, SurveyInstrument, QAReport
+from .schema import Blueprint, SurveyInstrument
 from .llm import chat_json
+from .brief import is_long, chunk_brief, condense_brief, render_digest, brief_excerpts
 from .prompts import (
     PLANNER_SYSTEM, PLANNER_USER,
     GENERATOR_SYSTEM, GENERATOR_USER,
-    QA_SYSTEM, QA_USER, HUMAN_REVISE_USER,
+    HUMAN_REVISE_USER,
 )
+from .qa import run_qa
+
+#progress callback - gets (node name, iteration) as each step starts, used by the job runner
+ProgressFn = Callable[[str, int], None]
 
 #shared memory that passes through all nodes
 #each node reads what it needs and writes its output back
@@ -24,19 +28,67 @@ class SurveyState(TypedDict, total=False):
     min_questions: int
     max_iters: int
     iter_count: int
+    languages: List[str] #extra languages to translate into once QA passes
+    raw_brief_for_planner: bool #planner reads the full brief even when there is a digest
+
+    #BRIEF - prepared once, what downstream nodes see instead of the raw brief
+    brief_context: str #the digest (or the brief itself if short)
+    qa_fixes: List[str] #fixes asked for by QA so far, only the generator sees them
+    brief_digest: dict
+    brief_chunks: List[str] #raw brief in chunks, for excerpts
 
     #OUTPUT - by agent
     blueprint: dict
     survey: dict
     qa: dict
+    translations: Dict[str, dict] #language code --> translated survey
+    translation_errors: Dict[str, str] #language code --> why it failed (the other languages still ship)
+
+    #TRACE - one record per LLM call (node, latency, deadline, hedged?, winner)
+    trace: List[dict]
 
     #HUMAN REVIEW
     human_notes: str
     human_revision_count: int
 
-#converts pydantic model to json schema 
-def _json_schema(model_cls) -> str:
-    return json.dumps(model_cls.model_json_schema(), indent=2)
+
+######################BRIEF NODE #####################
+
+#long briefs get condensed into a digest once, short ones pass straight through
+def prepare_brief_node(state: SurveyState) -> SurveyState:
+    brief = state["project_brief"]
+    if not is_long(brief):
+        state["brief_context"] = brief
+        state["brief_chunks"] = []
+        return state
+
+    chunks = chunk_brief(brief)
+    digest = condense_brief(brief, chunks, trace=state.setdefault("trace", [])).model_dump()
+    state["brief_digest"] = digest
+    state["brief_chunks"] = chunks
+    state["brief_context"] = render_digest(digest)
+    return state
+
+#what a node gets instead of the raw brief: the digest + the parts of the brief most related to the query
+def _brief_for(state: SurveyState, query: str) -> str:
+    context = state.get("brief_context") or state["project_brief"]
+    excerpts = brief_excerpts(state.get("brief_chunks") or [], query)
+    if excerpts:
+        context += "\n\nRelevant excerpts from the full brief:\n" + "\n---\n".join(excerpts)
+    return context
+
+#QA fixes go to the generator only - kept out of brief_context so the QA alignment prompt
+#(and its cache key) stays the same across revise loops
+def _with_fixes(state: SurveyState, brief: str) -> str:
+    fixes = state.get("qa_fixes") or []
+    if not fixes:
+        return brief
+    return brief + "\n\nQA-required fixes:\n" + "\n".join(f"- {x}" for x in fixes)
+
+#blueprint goals + topics, used to pick excerpts
+def _blueprint_query(state: SurveyState) -> str:
+    bp = state.get("blueprint") or {}
+    return " ".join((bp.get("goals") or []) + (bp.get("topics_to_measure") or []))
 
 
 ######################PLANNER NODE #####################
@@ -45,15 +97,19 @@ def _json_schema(model_cls) -> str:
 #output the blueprint
 
 def planner_node(state: SurveyState) -> SurveyState:
+    if state.get("raw_brief_for_planner", True):
+        brief = state["project_brief"]
+    else:
+        brief = state.get("brief_context") or state["project_brief"]
     user = PLANNER_USER.format(
-        project_brief=state["project_brief"],
+        project_brief=brief,
         audience=state["audience"],
         max_questions=state["max_questions"],
         min_questions=state["min_questions"],
     )
 
     #STEP 3: call the LLM 
-    out = chat_json(PLANNER_SYSTEM, user)
+    out = chat_json(PLANNER_SYSTEM, user, node="planner", trace=state.setdefault("trace", []))
     
     #STEP 4: validate output against schema
     bp = Blueprint.model_validate(out)
@@ -69,12 +125,12 @@ def planner_node(state: SurveyState) -> SurveyState:
 def generator_node(state: SurveyState) -> SurveyState:
     user = GENERATOR_USER.format(
         blueprint_json=json.dumps(state["blueprint"], indent=2),
-        project_brief=state["project_brief"],
+        project_brief=_with_fixes(state, _brief_for(state, _blueprint_query(state))),
         max_questions=state["max_questions"],
         min_questions=state["min_questions"], 
     )
     #STEP 3: call the LLM 
-    out = chat_json(GENERATOR_SYSTEM, user)
+    out = chat_json(GENERATOR_SYSTEM, user, node="generator", trace=state.setdefault("trace", []))
 
     #STEP 4: validate
     survey = SurveyInstrument.model_validate(out)
@@ -85,23 +141,23 @@ def generator_node(state: SurveyState) -> SurveyState:
 
 ##################################QA NODE#############################
 
-#QA checks:
-#survey matches blueprint?
-#blueprint matches brief?
-#biased questions?
-#too many questions?
+#QA checks (one checker each, run at the same time):
+#survey matches blueprint / brief? (alignment)
+#biased or two-in-one questions? (wording)
+#bad scales / overlapping options? (options)
+#too many questions? (count, done in code)
 
 #output: passed or not passed (if not then suggests fixes)
 
 def qa_node(state: SurveyState) -> SurveyState:
-    user = QA_USER.format(
-        project_brief=state["project_brief"],
-        blueprint_json=json.dumps(state["blueprint"], indent=2),
-        survey_json=json.dumps(state["survey"], indent=2),
+    #checkers run in parallel, each with only the context it needs (see qa.py)
+    qa = run_qa(
+        survey=state["survey"],
+        blueprint=state["blueprint"],
+        brief=_brief_for(state, _blueprint_query(state)),
         max_questions=state["max_questions"],
+        trace=state.setdefault("trace", []),
     )
-    out = chat_json(QA_SYSTEM, user)
-    qa = QAReport.model_validate(out)
     state["qa"] = qa.model_dump()
     return state
 
@@ -109,6 +165,7 @@ def qa_node(state: SurveyState) -> SurveyState:
 #####################AUTO LOOP DECISION  #########################
 
 def revise_or_end(state: SurveyState) -> str:
+    from langgraph.graph import END
    
     iters = state.get("iter_count", 0) #how many times we revise
     max_iters = state.get("max_iters", 3) #limit?
@@ -116,7 +173,7 @@ def revise_or_end(state: SurveyState) -> str:
     passed = bool(qa.get("passed", False)) #did QA pass?
 
     if passed:
-        return END #if passed then done
+        return "translate" #if passed then translate (no-op without languages) and done
     if iters >= max_iters:
         return END #if hit max iterations stop anyway
     return "revise" #if QA failed and still iterations revise 
@@ -130,39 +187,73 @@ def revise_node(state: SurveyState) -> SurveyState:
 
     #STEP 2: extract fixes from QA report 
     qa = state.get("qa") or {}
-    fixes = "\n".join([f"- {x}" for x in (qa.get("suggested_fixes") or [])]) or "- (No specific fixes provided; improve clarity/neutrality and meet constraints.)"
+    fixes = list(qa.get("suggested_fixes") or []) or ["(No specific fixes provided; improve clarity/neutrality and meet constraints.)"]
 
-    #STEP 3: put the fixes into the project brief 
-    augmented_brief = state["project_brief"] + "\n\nQA-required fixes:\n" + fixes
-    state["project_brief"] = augmented_brief
+    #STEP 3: keep the fixes for the generator (the brief context stays as prepared)
+    state["qa_fixes"] = (state.get("qa_fixes") or []) + fixes
 
     #STEP 4: re run generation with the QA fixes in the brief
     return generator_node(state)
 
 
+################## TRANSLATE NODE ###############################
+
+#only runs once QA has passed - translating a draft that will change is wasted work
+def translate_node(state: SurveyState) -> SurveyState:
+    from .translate import translate_all
+
+    state["translations"], state["translation_errors"] = translate_all(
+        state["survey"], state.get("languages") or [], trace=state.setdefault("trace", [])
+    )
+    return state
+
+
 ########################## connect everything ########################
 
+#calls the run's on_progress (passed in the langgraph config) before the node runs,
+#so the UI shows the node that is running, not the one that just finished
+def _reporting(name: str, fn: Callable[[SurveyState], SurveyState]):
+    def node(state: SurveyState, config) -> SurveyState:
+        report = ((config or {}).get("configurable") or {}).get("on_progress")
+        if report:
+            #revise bumps the counter itself, report the iteration it is starting
+            report(name, state.get("iter_count", 0) + (1 if name == "revise" else 0))
+        return fn(state)
+    return node
+
+#langgraph is imported here, not at the top, so importing this module stays cheap
 def build_graph():
+    from langgraph.graph import StateGraph, END
+
     g = StateGraph(SurveyState)
 
-    #register all nodes 
-    g.add_node("planner", planner_node)
-    g.add_node("generator", generator_node)
-    g.add_node("qa", qa_node)
-    g.add_node("revise", revise_node)
+    #register all nodes (wrapped so the caller hears about each node as it starts)
+    g.add_node("prepare_brief", _reporting("prepare_brief", prepare_brief_node))
+    g.add_node("planner", _reporting("planner", planner_node))
+    g.add_node("generator", _reporting("generator", generator_node))
+    g.add_node("qa", _reporting("qa", qa_node))
+    g.add_node("revise", _reporting("revise", revise_node))
+    g.add_node("translate", _reporting("translate", translate_node))
 
     #define flow 
-    #planner --> generator --> qa --> passed? --> if yes - end / if no - revise and then back to generator 
-    g.set_entry_point("planner")
+    #prepare_brief --> planner --> generator --> qa --> passed? --> if yes - translate, end / if no - revise and then back to generator 
+    g.set_entry_point("prepare_brief")
+    g.add_edge("prepare_brief", "planner")
     g.add_edge("planner", "generator")
     g.add_edge("generator", "qa")
-    g.add_conditional_edges("qa", revise_or_end, {"revise": "revise", END: END})
+    g.add_conditional_edges("qa", revise_or_end, {"revise": "revise", "translate": "translate", END: END})
     g.add_edge("revise", "qa")
+    g.add_edge("translate", END)
 
     return g.compile()
 
+#the graph is the same for every run - compile it once per process
+@lru_cache(maxsize=1)
+def get_graph():
+    return build_graph()
+
 ###########################run function #####################
-#complies the graph
+#gets the compiled graph
 #create initial state from user inputs
 #runs entire workflow
 #return final state
@@ -173,8 +264,11 @@ def run_survey_graph(
     max_questions: int = 20,
     min_questions: int = 15, 
     max_iters: int = 3,
+    languages: Optional[List[str]] = None,
+    raw_brief_for_planner: bool = True,
+    on_progress: Optional[ProgressFn] = None,
 ):
-    app = build_graph()
+    app = get_graph()
     init: SurveyState = {
         "project_brief": project_brief.strip(),
         "audience": audience.strip(),
@@ -182,9 +276,14 @@ def run_survey_graph(
         "min_questions": int(min_questions),
         "max_iters": int(max_iters),
         "iter_count": 0,
+        "languages": list(languages or []),
+        "translations": {},
+        "translation_errors": {},
+        "raw_brief_for_planner": bool(raw_brief_for_planner),
+        "trace": [],
     }
-    final_state = app.invoke(init)
-    return final_state
+    #the graph is compiled once, so the per-run callback travels in the config
+    return app.invoke(init, config={"configurable": {"on_progress": on_progress}})
 
 
 ##################### HUMAN REVISION #####################
@@ -192,7 +291,10 @@ def run_survey_graph(
 def run_human_revision(
     state: dict,
     human_notes: str,
+    on_progress: Optional[ProgressFn] = None,
 ) -> dict:
+    report = on_progress or (lambda node, iteration: None)
+
     # Convert to SurveyState
     current_state: SurveyState = {**state}
     
@@ -208,23 +310,53 @@ def run_human_revision(
         max_questions=current_state["max_questions"],
     )
     
-    out = chat_json(GENERATOR_SYSTEM, user)
+    # Progress is reported before each step, so the UI shows what is running
+    current_state["iter_count"] = 0
+    current_state["trace"] = list(current_state.get("trace") or [])
+    report("human_revise", 0)
+    out = chat_json(GENERATOR_SYSTEM, user, node="human_revise", trace=current_state["trace"])
     survey = SurveyInstrument.model_validate(out)
     current_state["survey"] = survey.model_dump()
     
     # Run QA on the revised survey
+    report("qa", 0)
     current_state = qa_node(current_state)
     
     # Auto-fix loop: if QA fails, keep revising until it passes or hits max iterations
-    current_state["iter_count"] = 0
     max_auto_fixes = 3
     while not current_state["qa"].get("passed", False) and current_state["iter_count"] < max_auto_fixes:
+        report("revise", current_state["iter_count"] + 1)
         current_state = revise_node(current_state)
+        report("qa", current_state["iter_count"])
         current_state = qa_node(current_state)
+
+    # Translations are only valid for the survey they were made from
+    current_state["translations"] = {}
+    current_state["translation_errors"] = {}
+    if current_state["qa"].get("passed", False):
+        report("translate", current_state["iter_count"])
+        current_state = translate_node(current_state)
     
     return current_state
 
 
+##################### TRANSLATE ON APPROVAL #####################
+
+#automatic translation waits for QA to pass - a survey the human approves anyway still needs its languages
+def run_translation(
+    state: dict,
+    languages: Optional[List[str]] = None,
+    on_progress: Optional[ProgressFn] = None,
+) -> dict:
+    current_state: SurveyState = {**state}
+    current_state["trace"] = list(current_state.get("trace") or [])
+    if languages is not None:
+        current_state["languages"] = list(languages)
+    if on_progress:
+        on_progress("translate", current_state.get("iter_count", 0))
+    return translate_node(current_state)
+
+
 ############################# FLOW SUMMARY ######################
 
 #1 USER fills in form in Streamlit 
@@ -0,0 +1,180 @@
+#background jobs - runs the workflows off the Streamlit script thread
+#FLOW: submit --> job row in sqlite (queued) --> worker thread runs it --> progress + result written back
+#the UI only ever reads the job table, so reruns / reconnects don't lose the work
+
+from __future__ import annotations
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from .llm import get_setting
+from .storage import connect
+
+#job kinds the runner knows about
+SURVEY = "survey"
+REVISION = "revision"
+TRANSLATION = "translation" #languages for a survey the human approved without QA passing
+
+#job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+ACTIVE = (QUEUED, RUNNING)
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    node TEXT,
+    iteration INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_owner ON jobs (owner, status);
+"""
+
+
+class JobRunner:
+    def __init__(self, max_workers: int = 4, db_name: str = "jobs.sqlite3"):
+        self._conn = connect(db_name)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+        #anything still queued/running belongs to a previous server process - it will never finish
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart.", time.time(), *ACTIVE),
+        )
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="survey-job")
+
+    #----- db helpers (one shared connection, serialised with a lock)
+    def _execute(self, sql: str, args: tuple = ()) -> None:
+        with self._lock:
+            self._conn.execute(sql, args)
+            self._conn.commit()
+
+    def _fetchone(self, sql: str, args: tuple = ()) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(sql, args).fetchone()
+        return dict(row) if row else None
+
+    #----- public API
+    def submit(self, owner: str, kind: str, params: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        #one active job per owner, so a single user can't fill the pool and starve everyone else
+        #check + insert in one transaction, so a double click (or two tabs on the same sid) can't both get in
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                active = self._conn.execute(
+                    "SELECT id FROM jobs WHERE owner = ? AND status IN (?, ?) LIMIT 1", (owner, *ACTIVE)
+                ).fetchone()
+                if active:
+                    raise RuntimeError(f"A job is already running for this session ({active['id']}).")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, owner, kind, status, params, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, owner, kind, QUEUED, json.dumps(params), now, now),
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        self._pool.submit(self._run, job_id, kind, params)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        job = self._fetchone("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        if job is None:
+            return None
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def active_job(self, owner: str) -> Optional[dict]:
+        return self._fetchone(
+            "SELECT id, kind, status FROM jobs WHERE owner = ? AND status IN (?, ?) ORDER BY created DESC",
+            (owner, *ACTIVE),
+        )
+
+    #----- worker
+    def _progress(self, job_id: str) -> Callable[[str, int], None]:
+        def report(node: str, iteration: int) -> None:
+            self._execute(
+                "UPDATE jobs SET node = ?, iteration = ?, updated = ? WHERE id = ?",
+                (node, int(iteration or 0), time.time(), job_id),
+            )
+        return report
+
+    def _run(self, job_id: str, kind: str, params: Dict[str, Any]) -> None:
+        self._execute("UPDATE jobs SET status = ?, updated = ? WHERE id = ?", (RUNNING, time.time(), job_id))
+        try:
+            #imported here so the worker pulls in langgraph/openai, not whoever imports jobs
+            from .graph import run_survey_graph, run_human_revision, run_translation
+
+            report = self._progress(job_id)
+            if kind == SURVEY:
+                result = run_survey_graph(**params, on_progress=report)
+            elif kind == REVISION:
+                result = run_human_revision(**params, on_progress=report)
+            elif kind == TRANSLATION:
+                result = run_translation(**params, on_progress=report)
+            else:
+                raise ValueError(f"Unknown job kind: {kind}")
+
+            self._record(kind, params, result)
+            self._execute(
+                "UPDATE jobs SET status = ?, result = ?, updated = ? WHERE id = ?",
+                (DONE, json.dumps(result), time.time(), job_id),
+            )
+        except Exception as e:
+            self._execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ?",
+                (FAILED, str(e), time.time(), job_id),
+            )
+
+    #version history + analytics corpus, written once per finished job even if no browser is watching
+    #these are side stores - a failure is logged, the survey is still delivered
+    #a translation job doesn't change the survey, its version and corpus row already exist
+    def _record(self, kind: str, params: Dict[str, Any], result: dict) -> None:
+        if kind == TRANSLATION:
+            return
+        from .versions import record_version
+        from . import corpus
+
+        note = "Generated" if kind == SURVEY else f"Human revision: {params['human_notes'].strip()}"
+        try:
+            record_version(result, note, new_project=kind == SURVEY)
+        except Exception:
+            logger.exception("Could not save the version of job result (%s)", kind)
+        #a revision starts from the earlier state's trace - only this job's calls are new
+        trace_from = len((params.get("state") or {}).get("trace") or []) if kind == REVISION else 0
+        try:
+            corpus.append_run(result, kind, trace_from=trace_from)
+        except Exception:
+            logger.exception("Could not append job result to the corpus (%s)", kind)
+
+
+#----- one runner per server process
+#Streamlit re-executes app.py on every interaction but modules stay imported, so this is shared by all sessions
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+def get_runner() -> JobRunner:
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner(max_workers=int(get_setting("JOB_WORKERS", "4")))
+        return _runner
@@ -2,14 +2,21 @@
 from __future__ import annotations
 import os
 import json
-import re
-from typing import Any, Dict, Optional
-from openai import OpenAI
-import streamlit as st
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from openai import OpenAI
 
 # ---- secrets helper -------------------------------------------------
+#streamlit is imported here so the rest of this module (e.g. JSON extraction) works without it
 def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
     try:
+        import streamlit as st
         if name in st.secrets:
             return st.secrets[name]
     except Exception:
@@ -17,7 +24,7 @@ def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
     return os.getenv(name, default)
 
 #--------client 
-def get_client() -> OpenAI:
+def _endpoint() -> tuple:
     api_key = get_setting("LLM_API_KEY") or get_setting("OPENAI_API_KEY")
     base_url = get_setting("LLM_BASE_URL", "https://api.openai.com/v1")
     if not api_key:
@@ -25,69 +32,347 @@ def get_client() -> OpenAI:
             "Missing LLM_API_KEY (or OPENAI_API_KEY). "
             "Add it to Streamlit Secrets or your local .env file."
         )
-    return OpenAI(api_key=api_key, base_url=base_url)
+    return api_key, base_url
+
+def get_client() -> OpenAI:
+    return _client(*_endpoint())
+
+#one client (and connection pool) per key/endpoint, openai is only imported on the first call
+#no SDK retries: they would run past the call's deadline, _complete retries within it instead
+@lru_cache(maxsize=8)
+def _client(api_key: str, base_url: str) -> OpenAI:
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
 
 #-------extract JSON from response that might have extra text
-def extract_json(text: str) -> dict:
+#one pass over the text, aware of strings and brackets, so prose with braces around the JSON
+#doesn't break it and output cut off at max_tokens can still be salvaged
+
+#characters allowed outside strings inside a JSON object (anything else means it was prose)
+_JSON_BARE = set(" \t\r\n:,-+.0123456789eEtrufalsn")
+_CLOSERS = {"{": "}", "[": "]"}
+
+#finds top-level objects: complete ones as (start, end), and an unfinished one at the end of the text
+#while inside an object each open container remembers its last "safe" cut point (end of its last complete value)
+#and where it opened, so a repair can tell whether it holds any complete value
+def _scan_json(text: str) -> Tuple[List[Tuple[int, int]], Optional[Tuple[int, list]]]:
+    complete: List[Tuple[int, int]] = []
+    frames: list = [] #[bracket, safe cut position, opened at] per open container
+    start = 0
+    in_str = escaped = False
+    n = len(text)
+    i = 0
+    while i < n:
+        c = text[i]
+        if not frames:
+            #a real object starts with {" or {}
+            if c == "{":
+                j = i + 1
+                while j < n and text[j] in " \t\r\n":
+                    j += 1
+                if j == n or text[j] in '"}':
+                    start = i
+                    frames.append([c, i + 1, i + 1])
+            i += 1
+            continue
+
+        if in_str:
+            if escaped:
+                escaped = False
+            elif c == "\\":
+                escaped = True
+            elif c == '"':
+                in_str = False
+                if frames[-1][0] == "[":
+                    frames[-1][1] = i + 1
+        elif c == '"':
+            in_str = True
+        elif c in "{[":
+            frames.append([c, i + 1, i + 1])
+        elif c in "}]":
+            if _CLOSERS[frames.pop()[0]] != c:
+                frames = [] #mismatched bracket, this was not JSON
+            elif not frames:
+                complete.append((start, i + 1))
+            else:
+                frames[-1][1] = i + 1
+        elif c == ",":
+            frames[-1][1] = i
+        elif c not in _JSON_BARE:
+            frames = [] #prose, not JSON
+        i += 1
+
+    return complete, ((start, frames) if frames else None)
+
+#cut the text at a frame's safe point and close every bracket still open above it
+def _close(text: str, start: int, frames: list, depth: int) -> Optional[dict]:
+    body = text[start:frames[depth][1]].rstrip().rstrip(",")
+    closing = "".join(_CLOSERS[f[0]] for f in reversed(frames[:depth + 1]))
+    try:
+        obj = json.loads(body + closing)
+    except json.JSONDecodeError:
+        return None
+    return obj if isinstance(obj, dict) and obj else None
+
+#close an unfinished object: cut back to a safe point and add the missing brackets
+#lists of objects: the items of a list nested in another list's item (questions in sections) are kept
+#or dropped whole, deeper lists (skip_rules) belong to that item. So the cut goes to that list, which
+#drops the unfinished question (and its partial skip rules) but keeps its complete siblings. Only when
+#it has no complete item yet does the cut go to the outer list (whole sections). If neither has a
+#complete item nothing usable was written - that is a failure, not a repair.
+def _repair_truncated(text: str, start: int, frames: list) -> Optional[Tuple[dict, str]]:
+    kinds = [f[0] for f in frames]
+    object_lists = [k for k in range(len(kinds) - 1) if kinds[k] == "[" and kinds[k + 1] == "{"]
+    if object_lists:
+        candidates = [k for k in reversed(object_lists[:2]) if frames[k][1] > frames[k][2]]
+    else:
+        candidates = list(range(len(kinds) - 1, -1, -1))
+
+    for depth in candidates:
+        obj = _close(text, start, frames, depth)
+        if obj is not None:
+            dropped = "dropped the incomplete last item, " if text[frames[depth][1]:].strip(" \t\r\n,") else ""
+            return obj, f"truncated: {dropped}closed {depth + 1} open brackets"
+    return None
+
+#returns (parsed json, repair) - repair is None for clean JSON, "extracted" when it was
+#surrounded by other text, or "truncated: ..." when unfinished output had to be closed
+def extract_json_with_repair(text: str) -> Tuple[dict, Optional[str]]:
     # Try direct parse first
     try:
-        return json.loads(text)
+        return json.loads(text), None
     except json.JSONDecodeError:
         pass
-    
-    # Try to find JSON in markdown code blocks
-    code_block = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
-    if code_block:
-        try:
-            return json.loads(code_block.group(1))
-        except json.JSONDecodeError:
-            pass
-    
-    # Try to find JSON object in text
-    json_match = re.search(r'\{[\s\S]*\}', text)
-    if json_match:
+
+    complete, unfinished = _scan_json(text)
+
+    #biggest complete object wins (small ones are usually examples in the prose)
+    best, best_len = None, 0
+    for s, e in complete:
+        if e - s <= best_len:
+            continue
         try:
-            return json.loads(json_match.group(0))
+            obj = json.loads(text[s:e])
         except json.JSONDecodeError:
-            pass
-    
+            continue
+        if isinstance(obj, dict):
+            best, best_len = obj, e - s
+
+    if unfinished and len(text) - unfinished[0] > best_len:
+        repaired = _repair_truncated(text, *unfinished)
+        if repaired:
+            return repaired
+    if best is not None:
+        return best, "extracted"
+
     raise RuntimeError(f"Could not extract valid JSON from response:\n{text}")
 
+def extract_json(text: str) -> dict:
+    return extract_json_with_repair(text)[0]
+
+#-------deadlines
+#every call gets a deadline so a stalled connection can't hang the workflow
+#override per node with LLM_TIMEOUT_<NODE> (e.g. LLM_TIMEOUT_GENERATOR=300) or for all with LLM_TIMEOUT
+DEFAULT_TIMEOUTS = {
+    "brief": 120,
+    "planner": 120,
+    "generator": 300,
+    "qa": 180,
+    "human_revise": 300,
+    "translate": 240,
+}
+DEFAULT_TIMEOUT = 180
+
+def node_timeout(node: Optional[str]) -> float:
+    if node:
+        value = get_setting(f"LLM_TIMEOUT_{node.upper()}")
+        if value:
+            return float(value)
+    value = get_setting("LLM_TIMEOUT")
+    if value:
+        return float(value)
+    return float(DEFAULT_TIMEOUTS.get(node or "", DEFAULT_TIMEOUT))
+
+#-------latency history
+#recent successful latencies per node, the hedge budget is their p90
+class _Latencies:
+    def __init__(self, size: int = 50):
+        self._size = size
+        self._data: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def add(self, node: str, seconds: float) -> None:
+        with self._lock:
+            self._data.setdefault(node, deque(maxlen=self._size)).append(seconds)
+
+    def p90(self, node: str, min_samples: int = 5) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._data.get(node, ()))
+        if len(samples) < min_samples:
+            return None
+        return samples[min(int(len(samples) * 0.9), len(samples) - 1)]
+
+latencies = _Latencies()
+
+#-------hedging
+#LLM_HEDGE=1 turns it on. If a call hasn't returned by its budget a duplicate goes to
+#LLM_HEDGE_BASE_URL (or the same endpoint), the first valid answer wins and the other is cancelled.
+#budget = LLM_HEDGE_AFTER_<NODE> / LLM_HEDGE_AFTER if set, else the observed p90 for the node
+def hedge_budget(node: Optional[str]) -> Optional[float]:
+    if str(get_setting("LLM_HEDGE", "0")).lower() not in ("1", "true", "yes", "on"):
+        return None
+    for name in ([f"LLM_HEDGE_AFTER_{node.upper()}"] if node else []) + ["LLM_HEDGE_AFTER"]:
+        value = get_setting(name)
+        if value:
+            return float(value)
+    return latencies.p90(node or "")
+
+def _hedge_endpoint() -> tuple:
+    api_key, base_url = _endpoint()
+    return get_setting("LLM_HEDGE_API_KEY") or api_key, get_setting("LLM_HEDGE_BASE_URL") or base_url
+
+#hedged requests get a client of their own (not the shared cached one) so they can be closed to cancel them
+def _own_client(api_key: str, base_url: str) -> OpenAI:
+    from openai import OpenAI
+    return OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+#runs the primary + hedge of hedged calls. Callers queue here from several pools (brief chunks, QA
+#checkers, translations), so the hedge budget is counted from when a request starts, not when it is queued
+_hedge_pool = ThreadPoolExecutor(max_workers=int(get_setting("LLM_HEDGE_WORKERS", "32")), thread_name_prefix="llm-hedge")
+
 #-------chat
+def _is_timeout(e: Exception) -> bool:
+    return type(e).__name__ in ("APITimeoutError", "TimeoutException", "ReadTimeout", "ConnectTimeout")
+
+#worth another try (rate limited, overloaded, dropped connection) - as long as the deadline allows
+_RETRYABLE = ("RateLimitError", "InternalServerError", "APIConnectionError")
+#what providers answer when they don't support response_format
+_FORMAT_REJECTED = ("BadRequestError", "UnprocessableEntityError")
+MAX_RETRIES = 2
+
+def _complete(client: OpenAI, model: str, messages: list, temperature: float, max_tokens: int, deadline: float) -> Tuple[Dict[str, Any], Optional[str]]:
+    def remaining() -> float:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError("deadline reached")
+        return left
+
+    request = dict(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        response_format={"type": "json_object"},
+    )
+    retries = 0
+    while True:
+        try:
+            resp = client.chat.completions.create(**request, timeout=remaining())
+            break
+        except Exception as e:
+            if _is_timeout(e) or isinstance(e, TimeoutError):
+                raise
+            name = type(e).__name__
+            # Some providers don't support response_format, try once without it
+            if name in _FORMAT_REJECTED and "response_format" in request:
+                del request["response_format"]
+                continue
+            #back off and retry only if there is still time for the retry to be useful
+            backoff = 0.5 * 2 ** retries
+            if name in _RETRYABLE and retries < MAX_RETRIES and deadline - time.monotonic() > backoff + 1:
+                retries += 1
+                time.sleep(backoff)
+                continue
+            raise
+    
+    content = resp.choices[0].message.content or "{}"
+    
+    return extract_json_with_repair(content)
+
 def chat_json(
     system: str,
     user: str,
     model: Optional[str] = None,
     temperature: float = 0.2,
     max_tokens: int = 8192,
+    node: Optional[str] = None,
+    trace: Optional[List[dict]] = None,
 ) -> Dict[str, Any]:
-    client = get_client()
     model = model or get_setting("LLM_MODEL", "Qwen/Qwen2.5-72B-Instruct")
-    
-    # Try with response_format first, fall back without it
+    messages = [
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ]
+    timeout = node_timeout(node)
+    budget = hedge_budget(node)
+    started = time.monotonic()
+    deadline = started + timeout
+    record = {"node": node, "timeout": timeout, "hedge_budget": budget, "hedged": False, "winner": "primary"}
+
     try:
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format={"type": "json_object"},
-        )
-    except Exception:
-        # Some providers don't support response_format
-        resp = client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": system},
-                {"role": "user", "content": user},
-            ],
-            temperature=temperature,
-            max_tokens=max_tokens,
-        )
-    
-    content = resp.choices[0].message.content or "{}"
-    
-    return extract_json(content)
+        if budget is None or budget >= timeout:
+            out, repair = _complete(get_client(), model, messages, temperature, max_tokens, deadline)
+        else:
+            out, repair = _hedged(model, messages, temperature, max_tokens, deadline, budget, record)
+    except Exception as e:
+        record.update(latency=round(time.monotonic() - started - record.get("queued", 0), 3), error=type(e).__name__)
+        if trace is not None:
+            trace.append(record)
+        if _is_timeout(e) or isinstance(e, TimeoutError):
+            raise RuntimeError(f"LLM call ({node or 'chat'}) did not finish within its {timeout:.0f}s deadline.") from e
+        raise
+
+    #measured from when the request was sent - a hedged call may have waited for a pool worker first
+    elapsed = time.monotonic() - started - record.get("queued", 0)
+    latencies.add(node or "", elapsed)
+    record["latency"] = round(elapsed, 3)
+    record["json_repair"] = repair
+    if trace is not None:
+        trace.append(record)
+    return out
+
+#primary now, duplicate after `budget` seconds, first valid response wins
+#both get a client of their own, so the loser can be cancelled by closing its connection
+def _hedged(model: str, messages: list, temperature: float, max_tokens: int, deadline: float, budget: float, record: dict) -> Tuple[Dict[str, Any], Optional[str]]:
+    primary_client = _own_client(*_endpoint())
+    started = threading.Event()
+    submitted = time.monotonic()
+
+    def primary():
+        #time spent waiting for a worker is not the endpoint being slow - kept out of latency and the budget
+        record["queued"] = round(time.monotonic() - submitted, 3)
+        started.set()
+        return _complete(primary_client, model, messages, temperature, max_tokens, deadline)
+
+    attempts = {_hedge_pool.submit(primary): ("primary", primary_client)}
+    try:
+        if not started.wait(timeout=max(deadline - time.monotonic(), 0)):
+            raise TimeoutError("deadline reached")
+        done, _ = wait(attempts, timeout=min(budget, max(deadline - time.monotonic(), 0)))
+        if not done:
+            api_key, base_url = _hedge_endpoint()
+            hedge_client = _own_client(api_key, base_url)
+            model_2 = get_setting("LLM_HEDGE_MODEL") or model
+            attempts[_hedge_pool.submit(_complete, hedge_client, model_2, messages, temperature, max_tokens, deadline)] = ("hedge", hedge_client)
+            record["hedged"] = True
+
+        pending = set(attempts)
+        error: Optional[Exception] = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("deadline reached")
+            for fut in done:
+                if fut.exception() is None:
+                    record["winner"] = attempts[fut][0]
+                    return fut.result()
+                error = fut.exception()
+        raise error
+    finally:
+        #cancel the loser: drop it if it hasn't started, close its connection if it has
+        for fut, (_, client) in attempts.items():
+            fut.cancel()
+            try:
+                client.close()
+            except Exception:
+                pass
@@ -0,0 +1,130 @@
+#fan-out QA - independent checkers run in parallel and are merged into one QA report
+#FLOW: survey --> alignment / wording / options checkers (LLM, concurrently) + count check (code)
+#      --> merge, drop duplicate issues --> QAReport
+#each checker only gets the context it needs, and its verdict is cached by exactly that context
+
+from __future__ import annotations
+import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .schema import QAReport
+from .llm import chat_json, get_setting
+from .cache import get_cache, cache_key
+from .prompts import (
+    QA_ALIGNMENT_SYSTEM, QA_ALIGNMENT_USER,
+    QA_WORDING_SYSTEM, QA_WORDING_USER,
+    QA_OPTIONS_SYSTEM, QA_OPTIONS_USER,
+)
+
+CHOICE_TYPES = ("single_choice", "multi_choice", "multiple_choice", "likert_5", "likert_7")
+
+
+def _questions(survey: dict) -> List[Tuple[str, dict]]:
+    return [(sec.get("title"), q) for sec in survey.get("sections", []) for q in sec.get("questions", [])]
+
+
+################## CONTEXT PER CHECKER #####################
+#each returns the user prompt, or None when there is nothing for that checker to look at
+
+def _alignment_prompt(survey: dict, blueprint: dict, brief: str) -> Optional[str]:
+    questions = [
+        {"id": q.get("id"), "section": title, "topic": q.get("topic"), "text": q.get("text")}
+        for title, q in _questions(survey)
+    ]
+    return QA_ALIGNMENT_USER.format(
+        project_brief=brief,
+        blueprint_json=json.dumps(blueprint, indent=2),
+        questions_json=json.dumps(questions, indent=2),
+    )
+
+#no blueprint, no brief, no options - just the words respondents read
+def _wording_prompt(survey: dict, blueprint: dict, brief: str) -> Optional[str]:
+    questions = [{"id": q.get("id"), "text": q.get("text")} for _, q in _questions(survey)]
+    return QA_WORDING_USER.format(questions_json=json.dumps(questions, indent=2))
+
+#only questions that have options
+def _options_prompt(survey: dict, blueprint: dict, brief: str) -> Optional[str]:
+    questions = [
+        {"id": q.get("id"), "text": q.get("text"), "type": q.get("type"), "options": q.get("options")}
+        for _, q in _questions(survey)
+        if q.get("type") in CHOICE_TYPES or q.get("options")
+    ]
+    if not questions:
+        return None
+    return QA_OPTIONS_USER.format(questions_json=json.dumps(questions, indent=2))
+
+#name --> (system prompt, builds the user prompt)
+CHECKERS: Dict[str, Tuple[str, Callable[[dict, dict, str], Optional[str]]]] = {
+    "alignment": (QA_ALIGNMENT_SYSTEM, _alignment_prompt),
+    "wording": (QA_WORDING_SYSTEM, _wording_prompt),
+    "options": (QA_OPTIONS_SYSTEM, _options_prompt),
+}
+
+
+################## CHECKS #####################
+
+#counting doesn't need a model
+def check_count(survey: dict, max_questions: int) -> QAReport:
+    n = len(_questions(survey))
+    if n <= max_questions:
+        return QAReport(passed=True)
+    return QAReport(
+        passed=False,
+        issues=[f"Survey has {n} questions, above the maximum of {max_questions}"],
+        suggested_fixes=[f"Remove or merge {n - max_questions} questions, keeping every blueprint topic covered"],
+    )
+
+def _run_checker(name: str, system: str, user: str, trace: Optional[list]) -> QAReport:
+    #same prompt (i.e. same survey content seen by this checker) + same model --> same verdict
+    cache = get_cache()
+    key = cache_key(get_setting("LLM_MODEL", "Qwen/Qwen2.5-72B-Instruct"), system, user)
+    cached = cache.get(f"qa_{name}", key)
+    if cached is not None:
+        return QAReport.model_validate(cached)
+
+    report = QAReport.model_validate(chat_json(system, user, node="qa", trace=trace))
+    cache.put(f"qa_{name}", key, report.model_dump())
+    return report
+
+#issues from different checkers often describe the same problem, compare them loosely
+def _norm(text: str) -> str:
+    return " ".join(text.lower().strip(" .").split())
+
+#issue i goes with fix i - de-duplicate the pairs on the issue, so dropping an issue drops its own fix
+def merge_reports(reports: List[QAReport]) -> QAReport:
+    issues: List[str] = []
+    fixes: List[str] = []
+    seen = set()
+    for report in reports:
+        for issue, fix in zip_longest(report.issues, report.suggested_fixes, fillvalue=""):
+            #a fix without an issue (the checker returned more fixes than issues) is compared on its own text
+            key = _norm(issue) or "fix:" + _norm(fix)
+            if key == "fix:" or key in seen:
+                continue
+            seen.add(key)
+            if issue:
+                issues.append(issue)
+            if fix:
+                fixes.append(fix)
+    passed = all(r.passed for r in reports) and not issues
+    return QAReport(passed=passed, issues=issues, suggested_fixes=fixes)
+
+def run_qa(
+    survey: dict,
+    blueprint: dict,
+    brief: str,
+    max_questions: int,
+    trace: Optional[list] = None,
+) -> QAReport:
+    jobs = {}
+    for name, (system, build) in CHECKERS.items():
+        user = build(survey, blueprint, brief)
+        if user is not None:
+            jobs[name] = (system, user)
+
+    with ThreadPoolExecutor(max_workers=len(CHECKERS)) as pool:
+        futures = {name: pool.submit(_run_checker, name, system, user, trace) for name, (system, user) in jobs.items()}
+        reports = [check_count(survey, max_questions)] + [futures[name].result() for name in jobs]
+    return merge_reports(reports)
@@ -1,11 +1,15 @@
 #functions for displaying and analysing the survey output
 
 from __future__ import annotations
-from typing import Dict, Any, List
-import pandas as pd
+from typing import TYPE_CHECKING, Dict, Any, List
+from io import BytesIO
 
-#loops through all sections, questions and flattens everything into a table
-def extract_codebook(survey: Dict[str, Any]) -> pd.DataFrame:
+#pandas and python-docx are slow to import - only load them when we actually build a table / document
+if TYPE_CHECKING:
+    import pandas as pd
+
+#loops through all sections, questions and flattens everything into rows
+def codebook_rows(survey: Dict[str, Any]) -> List[dict]:
     rows: List[dict] = []
     for sec in survey.get("sections", []):
         for q in sec.get("questions", []):
@@ -19,7 +23,28 @@ def extract_codebook(survey: Dict[str, Any]) -> pd.DataFrame:
                 "analysis_tag": q.get("analysis_tag"),
                 "required": q.get("required", True),
             })
-    return pd.DataFrame(rows)
+    return rows
+
+#same rows as a table
+def extract_codebook(survey: Dict[str, Any]) -> pd.DataFrame:
+    import pandas as pd
+
+    return pd.DataFrame(codebook_rows(survey))
+
+#one codebook for all language variants, stacked with a language column (ids line up across languages)
+def extract_multilingual_codebook(
+    survey: Dict[str, Any],
+    translations: Dict[str, Dict[str, Any]],
+    source_language: str = "en",
+) -> pd.DataFrame:
+    import pandas as pd
+
+    frames = []
+    for lang, variant in [(source_language, survey), *translations.items()]:
+        df = extract_codebook(variant)
+        df.insert(0, "language", lang)
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
 
 #count questions across sections
 def count_questions(survey: Dict[str, Any]) -> int:
@@ -29,16 +54,13 @@ def count_questions(survey: Dict[str, Any]) -> int:
     return n
 
 
-from docx import Document
-from docx.shared import Pt, Inches
-from docx.enum.text import WD_BREAK
-from io import BytesIO
+def generate_survey_docx(survey: dict, title: str = "Survey") -> bytes:
+    from docx import Document
 
-def generate_survey_docx(survey: dict) -> bytes:
     doc = Document()
     
     # Title
-    title = doc.add_heading("Survey", level=0)
+    doc.add_heading(title, level=0)
     
     for sec in survey.get("sections", []):
         # Section title
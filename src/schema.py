@@ -73,3 +73,13 @@ class QAReport(BaseModel):
 class HumanReview(BaseModel):
     approved: bool = False
     notes: Optional[str] = None
+
+#condensed version of a long project brief (e.g. a 20 page RFP)
+#downstream nodes get this instead of the raw text so it isn't re-sent on every call
+class BriefDigest(BaseModel):
+    goals: List[str] = Field(default_factory=list) #what the client wants to learn
+    target_audience: List[str] = Field(default_factory=list) #who should be surveyed
+    topics: List[str] = Field(default_factory=list) #things to measure
+    requirements: List[str] = Field(default_factory=list) #must-haves (questions, scales, modules, comparability)
+    constraints: List[str] = Field(default_factory=list) #length, mode, language, timing etc
+    context: List[str] = Field(default_factory=list) #background that affects wording
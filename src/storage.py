@@ -0,0 +1,23 @@
+#local on-disk storage - where jobs, caches etc live between sessions
+
+from __future__ import annotations
+import os
+import sqlite3
+
+from .llm import get_setting
+
+#----- data dir
+#everything is kept under one folder so it is easy to wipe / mount a volume on
+def data_path(name: str) -> str:
+    root = get_setting("SURVEY_DATA_DIR", ".survey_data")
+    os.makedirs(root, exist_ok=True)
+    return os.path.join(root, name)
+
+#----- sqlite connection
+#WAL so readers (the UI polling) never block the writer (the worker threads)
+def connect(name: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(data_path(name), timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,204 @@
+#translation stage - turns the approved survey into other language variants
+#FLOW: survey --> split into segments (titles, question text, options) --> translation memory lookup
+#      --> LLM only for the misses --> rebuild the survey with the same ids / types / skip rules
+
+from __future__ import annotations
+import copy
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .llm import chat_json
+from .prompts import TRANSLATE_SYSTEM, TRANSLATE_USER
+from .storage import connect
+
+#source language of every survey we generate
+SOURCE_LANGUAGE = "en"
+
+#languages offered in the UI (code -> name used in the prompt)
+LANGUAGES = {
+    "fr": "French (Canadian)",
+    "es": "Spanish",
+    "pt": "Portuguese",
+    "de": "German",
+    "it": "Italian",
+    "zh": "Chinese (Simplified)",
+    "pa": "Punjabi",
+    "ar": "Arabic",
+}
+
+#how many segments go in one LLM call
+BATCH_SIZE = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tm (
+    lang TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (lang, source)
+);
+"""
+
+
+################## TRANSLATION MEMORY #####################
+
+#segment level cache: the same option / question text is only ever translated once per language
+class TranslationMemory:
+    def __init__(self, db_name: str = "tm.sqlite3"):
+        self._conn = connect(db_name)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+
+    def lookup(self, lang: str, sources: Iterable[str]) -> Dict[str, str]:
+        sources = list(sources)
+        found: Dict[str, str] = {}
+        with self._lock:
+            #sqlite has a limit on bound parameters, so look up in slices
+            for i in range(0, len(sources), 500):
+                part = sources[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT source, target FROM tm WHERE lang = ? AND source IN ({','.join('?' * len(part))})",
+                    (lang, *part),
+                ).fetchall()
+                found.update({r["source"]: r["target"] for r in rows})
+        return found
+
+    def store(self, lang: str, pairs: Dict[str, str]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tm (lang, source, target, updated) VALUES (?, ?, ?, ?)",
+                [(lang, src, tgt, now) for src, tgt in pairs.items()],
+            )
+            self._conn.commit()
+
+
+_memory: Optional[TranslationMemory] = None
+_memory_lock = threading.Lock()
+
+def get_memory() -> TranslationMemory:
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
+
+
+##################### SEGMENTS ###########################
+
+#every piece of respondent-facing text, de-duplicated (topic / analysis_tag stay in English for the codebook)
+def survey_segments(survey: dict) -> List[str]:
+    seen: Dict[str, None] = {}
+    for sec in survey.get("sections", []):
+        for text in (sec.get("title"), sec.get("description")):
+            if text:
+                seen[text] = None
+        for q in sec.get("questions", []):
+            if q.get("text"):
+                seen[q["text"]] = None
+            for opt in q.get("options") or []:
+                seen[opt] = None
+    return list(seen)
+
+#rebuild the survey with translated text - ids, types, required flags and skip rules are copied as-is
+def apply_translations(survey: dict, translated: Dict[str, str]) -> dict:
+    def tr(text):
+        return translated.get(text, text) if isinstance(text, str) else text
+
+    out = copy.deepcopy(survey)
+    for sec in out.get("sections", []):
+        sec["title"] = tr(sec.get("title"))
+        sec["description"] = tr(sec.get("description"))
+        for q in sec.get("questions", []):
+            q["text"] = tr(q.get("text"))
+            if q.get("options"):
+                q["options"] = [tr(opt) for opt in q["options"]]
+    #skip rule values point at option labels, so they have to follow the options
+    for sec in out.get("sections", []):
+        for q in sec.get("questions", []):
+            for rule in q.get("skip_rules") or []:
+                if isinstance(rule.get("value"), list):
+                    rule["value"] = [tr(v) for v in rule["value"]]
+                else:
+                    rule["value"] = tr(rule.get("value"))
+    return out
+
+#the structure must be identical to the source, otherwise the variants can't be fielded / merged
+def _check_structure(source: dict, variant: dict, lang: str) -> None:
+    def shape(s: dict):
+        return [
+            [(q.get("id"), q.get("type"), len(q.get("options") or []), len(q.get("skip_rules") or []))
+             for q in sec.get("questions", [])]
+            for sec in s.get("sections", [])
+        ]
+    if shape(source) != shape(variant):
+        raise RuntimeError(f"Translated survey ({lang}) does not match the source structure.")
+
+
+##################### TRANSLATE ###########################
+
+def _translate_segments(segments: List[str], lang: str, trace: Optional[list] = None) -> Dict[str, str]:
+    language = LANGUAGES.get(lang, lang)
+    result: Dict[str, str] = {}
+    for i in range(0, len(segments), BATCH_SIZE):
+        batch = segments[i:i + BATCH_SIZE]
+        ids = {str(n + 1): text for n, text in enumerate(batch)}
+        user = TRANSLATE_USER.format(
+            language=language,
+            segments_json=json.dumps(ids, indent=2, ensure_ascii=False),
+        )
+        out = chat_json(TRANSLATE_SYSTEM, user, node="translate", trace=trace)
+        translations = out.get("translations") or {}
+        missing = [k for k in ids if not isinstance(translations.get(k), str) or not translations[k].strip()]
+        if missing:
+            raise RuntimeError(f"Translation to {language} is missing segments: {', '.join(missing)}")
+        result.update({ids[k]: translations[k].strip() for k in ids})
+    return result
+
+#one language: memory first, LLM for whatever is new, then rebuild and validate
+def translate_survey(
+    survey: dict,
+    lang: str,
+    memory: Optional[TranslationMemory] = None,
+    trace: Optional[list] = None,
+) -> dict:
+    #app.py imports this module for LANGUAGES, so keep pydantic off the startup path
+    from .schema import SurveyInstrument
+
+    memory = memory or get_memory()
+    segments = survey_segments(survey)
+    translated = memory.lookup(lang, segments)
+    misses = [s for s in segments if s not in translated]
+    if misses:
+        fresh = _translate_segments(misses, lang, trace)
+        memory.store(lang, fresh)
+        translated.update(fresh)
+
+    variant = SurveyInstrument.model_validate(apply_translations(survey, translated)).model_dump()
+    _check_structure(survey, variant, lang)
+    return variant
+
+#all languages at once - each language is independent so they run concurrently
+#a failing language doesn't sink the others: returns (variants that worked, language code --> error)
+def translate_all(
+    survey: dict,
+    languages: List[str],
+    trace: Optional[list] = None,
+) -> Tuple[Dict[str, dict], Dict[str, str]]:
+    languages = [lang for lang in dict.fromkeys(languages) if lang != SOURCE_LANGUAGE]
+    if not languages:
+        return {}, {}
+    memory = get_memory()
+    translations: Dict[str, dict] = {}
+    errors: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=len(languages)) as pool:
+        futures = {lang: pool.submit(translate_survey, survey, lang, memory, trace) for lang in languages}
+        for lang, fut in futures.items():
+            try:
+                translations[lang] = fut.result()
+            except Exception as e:
+                errors[lang] = str(e) or type(e).__name__
+    return translations, errors
@@ -0,0 +1,297 @@
+#version store - every revision of a survey, without storing full copies
+#each question and section is saved once under the hash of its content (like git objects)
+#a version is just the hash of its root: {"sections": [section hashes]}
+#so unchanged questions are shared between versions and diffs can skip anything with an equal hash
+
+from __future__ import annotations
+import hashlib
+import json
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from .storage import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    hash TEXT PRIMARY KEY,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS versions (
+    project TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    root TEXT NOT NULL,
+    note TEXT,
+    qa TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (project, version)
+);
+"""
+
+#question fields compared field by field in a diff (options get their own added/removed lists)
+DIFF_FIELDS = ["text", "type", "required", "topic", "analysis_tag", "notes", "skip_rules"]
+
+
+def _canonical(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def content_hash(obj: Any) -> str:
+    return hashlib.sha256(_canonical(obj).encode("utf-8")).hexdigest()
+
+
+class VersionStore:
+    def __init__(self, db_name: str = "versions.sqlite3"):
+        self._conn = connect(db_name)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+        #stores created before QA reports were kept with versions
+        columns = {r["name"] for r in self._conn.execute("PRAGMA table_info(versions)")}
+        if "qa" not in columns:
+            self._conn.execute("ALTER TABLE versions ADD COLUMN qa TEXT")
+            self._conn.commit()
+
+    #----- objects
+    def _put(self, obj: Any, pending: Dict[str, str]) -> str:
+        h = content_hash(obj)
+        pending.setdefault(h, _canonical(obj))
+        return h
+
+    def _get_many(self, hashes: List[str]) -> Dict[str, Any]:
+        found: Dict[str, Any] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, body FROM objects WHERE hash IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                found.update({r["hash"]: json.loads(r["body"]) for r in rows})
+        return found
+
+    def _get(self, h: str) -> Any:
+        return self._get_many([h])[h]
+
+    #----- versions
+    #the QA report is kept with the version, so a rollback gets the verdict for that survey back
+    def commit(self, project: str, survey: dict, note: str = "", qa: Optional[dict] = None) -> int:
+        #build the tree bottom-up: questions --> sections --> root
+        #sections keep [id, hash] pairs so a diff can match questions without loading them
+        pending: Dict[str, str] = {}
+        section_hashes = []
+        for sec in survey.get("sections", []):
+            questions = [[q.get("id"), self._put(q, pending)] for q in sec.get("questions", [])]
+            section_hashes.append(self._put({
+                "title": sec.get("title"),
+                "description": sec.get("description"),
+                "questions": questions,
+            }, pending))
+        root = self._put({"sections": section_hashes}, pending)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version, root FROM versions WHERE project = ? ORDER BY version DESC LIMIT 1", (project,)
+            ).fetchone()
+            if row and row["root"] == root:
+                return row["version"] #nothing changed, don't add an empty version
+            version = (row["version"] if row else 0) + 1
+            self._conn.executemany("INSERT OR IGNORE INTO objects (hash, body) VALUES (?, ?)", list(pending.items()))
+            self._conn.execute(
+                "INSERT INTO versions (project, version, root, note, qa, created) VALUES (?, ?, ?, ?, ?, ?)",
+                (project, version, root, note, json.dumps(qa) if qa is not None else None, time.time()),
+            )
+            self._conn.commit()
+        return version
+
+    def history(self, project: str) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT version, root, note, created FROM versions WHERE project = ? ORDER BY version", (project,)
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def _root(self, project: str, version: int) -> str:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT root FROM versions WHERE project = ? AND version = ?", (project, version)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No version {version} for project {project}")
+        return row["root"]
+
+    #rebuild the full survey for a version (used for rollback)
+    def checkout(self, project: str, version: int) -> dict:
+        root = self._get(self._root(project, version))
+        sections = self._get_many(root["sections"])
+        q_hashes = [h for sh in root["sections"] for _, h in sections[sh]["questions"]]
+        questions = self._get_many(q_hashes)
+        return {"sections": [
+            {
+                "title": sections[sh]["title"],
+                "description": sections[sh]["description"],
+                "questions": [questions[h] for _, h in sections[sh]["questions"]],
+            }
+            for sh in root["sections"]
+        ]}
+
+    #QA report saved with a version (None for versions saved without one)
+    def qa_report(self, project: str, version: int) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT qa FROM versions WHERE project = ? AND version = ?", (project, version)
+            ).fetchone()
+        if row is None:
+            raise KeyError(f"No version {version} for project {project}")
+        return json.loads(row["qa"]) if row["qa"] else None
+
+    #structural diff between two versions: added / removed / modified questions and section changes
+    def diff(self, project: str, old: int, new: int) -> dict:
+        result = {
+            "added": [], "removed": [], "modified": [],
+            "sections_added": [], "sections_removed": [], "sections_modified": [],
+            "moved": [], "reordered": [], "sections_reordered": False,
+        }
+        old_root, new_root = self._root(project, old), self._root(project, new)
+        if old_root == new_root:
+            return result
+
+        roots = self._get_many([old_root, new_root])
+        old_secs, new_secs = roots[old_root]["sections"], roots[new_root]["sections"]
+        shared = set(old_secs) & set(new_secs)
+        #identical sections can't contain changes - only load the ones that differ
+        sections = self._get_many([h for h in old_secs + new_secs if h not in shared])
+        #unchanged sections in a different order
+        result["sections_reordered"] = [h for h in old_secs if h in shared] != [h for h in new_secs if h in shared]
+
+        #question id --> hash and question id --> position of its section, for the changed sections
+        def index(sec_hashes: List[str]) -> Tuple[Dict[str, str], Dict[str, int], List[Tuple[int, dict]]]:
+            ids: Dict[str, str] = {}
+            where: Dict[str, int] = {}
+            changed: List[Tuple[int, dict]] = []
+            for pos, sh in enumerate(sec_hashes):
+                if sh in shared:
+                    continue
+                changed.append((pos, sections[sh]))
+                for qid, qh in sections[sh]["questions"]:
+                    ids[qid] = qh
+                    where[qid] = pos
+            return ids, where, changed
+
+        old_q, old_where, old_changed = index(old_secs)
+        new_q, new_where, new_changed = index(new_secs)
+
+        #pair changed sections on title first, then whatever is left by position (a rename)
+        #pairs are (old position, old section, new position, new section)
+        pairs, unmatched_old, unmatched_new = [], list(old_changed), []
+        for pos, sec in new_changed:
+            match = next((o for o in unmatched_old if o[1]["title"] == sec["title"]), None)
+            if match is None:
+                unmatched_new.append((pos, sec))
+            else:
+                unmatched_old.remove(match)
+                pairs.append((*match, pos, sec))
+        pairs += [(*o, *n) for o, n in zip(unmatched_old, unmatched_new)]
+        result["sections_added"] = [sec["title"] for _, sec in unmatched_new[len(unmatched_old):]]
+        result["sections_removed"] = [sec["title"] for _, sec in unmatched_old[len(unmatched_new):]]
+        pairs.sort(key=lambda p: p[2])
+        for _, before, pos, after in pairs:
+            fields = [f for f in ("title", "description") if before.get(f) != after.get(f)]
+            if fields:
+                result["sections_modified"].append({
+                    "position": pos + 1,
+                    "old_title": before["title"],
+                    "title": after["title"],
+                    "fields": fields,
+                })
+            #questions kept in this section but in a different order (the [id, hash] lists are enough)
+            kept_before = {qid for qid, _ in before["questions"]}
+            kept_after = {qid for qid, _ in after["questions"]}
+            if [q for q, _ in before["questions"] if q in kept_after] != [q for q, _ in after["questions"] if q in kept_before]:
+                result["reordered"].append(after["title"])
+
+        #a question in both versions whose section isn't the partner of its old section has moved
+        partner = {old_pos: new_pos for old_pos, _, new_pos, _ in pairs}
+        titles = {pos: sec["title"] for pos, sec in new_changed}
+        old_titles = {pos: sec["title"] for pos, sec in old_changed}
+        for qid, pos in new_where.items():
+            if qid in old_where and partner.get(old_where[qid]) != pos:
+                result["moved"].append({"id": qid, "from": old_titles[old_where[qid]], "to": titles[pos]})
+
+        changed = [qid for qid in new_q if qid in old_q and new_q[qid] != old_q[qid]]
+        bodies = self._get_many([old_q[qid] for qid in changed] + [new_q[qid] for qid in changed])
+        for qid in changed:
+            before, after = bodies[old_q[qid]], bodies[new_q[qid]]
+            old_opts, new_opts = before.get("options") or [], after.get("options") or []
+            fields = [f for f in DIFF_FIELDS if before.get(f) != after.get(f)]
+            if old_opts != new_opts:
+                fields.append("options")
+            result["modified"].append({
+                "id": qid,
+                "fields": fields,
+                "options_added": [o for o in new_opts if o not in old_opts],
+                "options_removed": [o for o in old_opts if o not in new_opts],
+            })
+        #a question only "moves" between changed sections, so it shows up in both maps - not added/removed
+        result["added"] = [qid for qid in new_q if qid not in old_q]
+        result["removed"] = [qid for qid in old_q if qid not in new_q]
+        return result
+
+
+#one line per change, for the UI
+def summarize_diff(diff: dict) -> List[str]:
+    lines = []
+    for title in diff["sections_added"]:
+        lines.append(f"Section added: {title}")
+    for title in diff["sections_removed"]:
+        lines.append(f"Section removed: {title}")
+    if diff.get("sections_reordered"):
+        lines.append("Sections reordered")
+    for m in diff.get("sections_modified", []):
+        if "title" in m["fields"]:
+            lines.append(f"Section {m['position']} renamed: {m['old_title']} → {m['title']}")
+        if "description" in m["fields"]:
+            lines.append(f"Section {m['position']} ({m['title']}): description changed")
+    if diff["added"]:
+        lines.append(f"Questions added: {', '.join(diff['added'])}")
+    if diff["removed"]:
+        lines.append(f"Questions removed: {', '.join(diff['removed'])}")
+    for m in diff.get("moved", []):
+        lines.append(f"{m['id']} moved: {m['from']} → {m['to']}")
+    for title in diff.get("reordered", []):
+        lines.append(f"Questions reordered in {title}")
+    for m in diff["modified"]:
+        parts = []
+        fields = [f for f in m["fields"] if f != "options"]
+        if fields:
+            parts.append("changed " + ", ".join(fields))
+        if "options" in m["fields"] and not (m["options_added"] or m["options_removed"]):
+            parts.append("options reordered")
+        if m["options_added"]:
+            parts.append("options added: " + ", ".join(m["options_added"]))
+        if m["options_removed"]:
+            parts.append("options removed: " + ", ".join(m["options_removed"]))
+        if not parts:
+            parts.append("changed")
+        lines.append(f"{m['id']}: " + "; ".join(parts))
+    return lines
+
+
+#save a survey state as the next version of its project (a new project when asked, or when it has none)
+#sets project_id / version on the state, returns the version it was saved after (None for a new project)
+def record_version(state: dict, note: str, new_project: bool = False) -> Optional[int]:
+    previous = state.get("version")
+    if new_project or not state.get("project_id"):
+        state["project_id"] = uuid.uuid4().hex
+        previous = None
+    state["version"] = get_store().commit(state["project_id"], state["survey"], note, qa=state.get("qa"))
+    return previous
+
+
+_store: Optional[VersionStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> VersionStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = VersionStore()
+        return _store
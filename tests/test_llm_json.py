@@ -0,0 +1,98 @@
+#JSON extraction / truncation repair (src/llm.py) - runs without streamlit or an API key
+import json
+
+import pytest
+
+from src.llm import extract_json, extract_json_with_repair
+
+
+SURVEY = {
+    "sections": [
+        {"title": "About you", "questions": [
+            {"id": "Q1", "text": "Age?", "type": "numeric"},
+            {"id": "Q2", "text": "Do you drive?", "type": "single_choice", "options": ["Yes", "No"],
+             "skip_rules": [{"if_question_id": "Q2", "operator": "equals", "value": "No", "goto_question_id": "Q5"}]},
+        ]},
+        {"title": "Commute", "questions": [
+            {"id": "Q3", "text": "How far?", "type": "numeric"},
+        ]},
+    ]
+}
+
+
+def test_clean_json():
+    assert extract_json_with_repair(json.dumps(SURVEY)) == (SURVEY, None)
+
+def test_prose_with_braces_around_json():
+    text = 'Sure! I kept {placeholders} as-is. {"passed": true, "issues": []} Let me know {if} anything.'
+    assert extract_json_with_repair(text) == ({"passed": True, "issues": []}, "extracted")
+
+def test_braces_inside_strings():
+    text = 'Result: {"text": "Use {name} and [brackets] \\"quoted\\" }", "n": 1}'
+    assert extract_json(text) == {"text": 'Use {name} and [brackets] "quoted" }', "n": 1}
+
+def test_code_fence():
+    text = "```json\n" + json.dumps(SURVEY, indent=2) + "\n```"
+    assert extract_json_with_repair(text) == (SURVEY, "extracted")
+
+def test_biggest_object_wins_over_example():
+    text = 'For example {"a": 1}. Here it is:\n{"passed": false, "issues": ["Q1 is leading"]}'
+    assert extract_json(text) == {"passed": False, "issues": ["Q1 is leading"]}
+
+def test_truncated_in_string():
+    full = json.dumps(SURVEY)
+    text = full[:full.index("How far?") + 4]
+    obj, repair = extract_json_with_repair(text)
+    #the unfinished section is dropped, complete ones are kept as they were
+    assert obj == {"sections": SURVEY["sections"][:1]}
+    assert repair.startswith("truncated")
+
+def test_truncated_in_number():
+    obj, repair = extract_json_with_repair('{"passed": false, "max": 12, "count": 4')
+    #the last number may be cut short, so it is not kept
+    assert obj == {"passed": False, "max": 12}
+    assert repair.startswith("truncated")
+
+def test_truncated_in_nested_skip_rules():
+    full = json.dumps(SURVEY)
+    text = full[:full.index('"goto_question_id"')]
+    obj, repair = extract_json_with_repair(text)
+    #Q2 is cut off inside its skip rules - it is dropped, not kept without them
+    assert obj == {"sections": [{"title": "About you", "questions": [SURVEY["sections"][0]["questions"][0]]}]}
+    assert repair.startswith("truncated")
+
+def test_truncated_in_last_section_keeps_its_complete_questions():
+    survey = {"sections": [
+        {"title": f"S{s}", "questions": [{"id": f"Q{s * 10 + n}", "text": "?", "type": "free_text",
+                                          "skip_rules": [{"if_question_id": "Q1", "operator": "equals", "value": "x",
+                                                          "goto_question_id": "Q2"}]}
+                                         for n in range(1, 11)]}
+        for s in range(2)
+    ]}
+    full = json.dumps(survey)
+    #cut off inside Q20's skip rules
+    text = full[:full.index('"goto_question_id"', full.index('"Q20"'))]
+    obj, repair = extract_json_with_repair(text)
+    assert obj["sections"][0] == survey["sections"][0]
+    assert obj["sections"][1]["questions"] == survey["sections"][1]["questions"][:9]
+    assert repair.startswith("truncated: dropped the incomplete last item")
+
+def test_first_question_cut_off_is_a_failure():
+    full = json.dumps(SURVEY)
+    with pytest.raises(RuntimeError):
+        extract_json(full[:full.index('"Age?"')])
+    with pytest.raises(RuntimeError):
+        extract_json('{"sections": [{"title": "About you", "questi')
+
+def test_truncated_keeps_complete_sections():
+    full = json.dumps(SURVEY)
+    text = full[:full.index('"How far?"')]
+    assert extract_json(text) == {"sections": SURVEY["sections"][:1]}
+
+def test_empty_repair_is_a_failure():
+    with pytest.raises(RuntimeError):
+        extract_json('Sure {"a": 1')
+
+def test_no_json():
+    with pytest.raises(RuntimeError):
+        extract_json("I could not produce a survey for this brief {sorry}.")
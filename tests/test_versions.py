@@ -0,0 +1,99 @@
+#version store diffs (src/versions.py) - sqlite in a temp data dir, no API key needed
+import copy
+
+import pytest
+
+from src.versions import VersionStore, summarize_diff
+
+
+def q(qid, text="?", **extra):
+    return {"id": qid, "text": text, "type": "free_text", **extra}
+
+BASE = {"sections": [
+    {"title": "About you", "description": "Profile", "questions": [q("Q1"), q("Q2"), q("Q3")]},
+    {"title": "Commute", "description": "Travel", "questions": [q("Q4"), q("Q5")]},
+    {"title": "Wrap up", "description": None, "questions": [q("Q6")]},
+]}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setenv("SURVEY_DATA_DIR", str(tmp_path))
+    return VersionStore()
+
+def diff_of(store, new):
+    old_v = store.commit("p", BASE)
+    new_v = store.commit("p", new)
+    return store.diff("p", old_v, new_v)
+
+def edited(fn):
+    survey = copy.deepcopy(BASE)
+    fn(survey["sections"])
+    return survey
+
+
+def test_no_change(store):
+    v = store.commit("p", BASE)
+    assert store.commit("p", copy.deepcopy(BASE)) == v
+    assert summarize_diff(store.diff("p", v, v)) == []
+
+def test_checkout_roundtrip(store):
+    v = store.commit("p", BASE, qa={"passed": True})
+    assert store.checkout("p", v) == BASE
+    assert store.qa_report("p", v) == {"passed": True}
+
+def test_added_removed_modified(store):
+    def change(secs):
+        secs[0]["questions"][1] = q("Q2", "Changed?")
+        secs[1]["questions"].append(q("Q7"))
+        del secs[2]["questions"][0]
+    d = diff_of(store, edited(change))
+    assert d["added"] == ["Q7"] and d["removed"] == ["Q6"]
+    assert [m["id"] for m in d["modified"]] == ["Q2"] and d["modified"][0]["fields"] == ["text"]
+    assert d["moved"] == [] and d["reordered"] == []
+
+def test_rename_is_not_add_and_remove(store):
+    d = diff_of(store, edited(lambda secs: secs[1].update(title="Getting to work")))
+    assert d["sections_added"] == [] and d["sections_removed"] == []
+    assert d["sections_modified"] == [{"position": 2, "old_title": "Commute", "title": "Getting to work", "fields": ["title"]}]
+    assert summarize_diff(d) == ["Section 2 renamed: Commute → Getting to work"]
+
+def test_description_change(store):
+    d = diff_of(store, edited(lambda secs: secs[0].update(description="Who you are")))
+    assert summarize_diff(d) == ["Section 1 (About you): description changed"]
+
+def test_section_added_and_removed(store):
+    def change(secs):
+        secs[2] = {"title": "Extra", "description": None, "questions": [q("Q8")]}
+        secs.append({"title": "More", "description": None, "questions": [q("Q9")]})
+    d = diff_of(store, edited(change))
+    #Wrap up / Extra pair up by position as a rename, More is new
+    assert d["sections_added"] == ["More"]
+    assert d["sections_modified"][0]["old_title"] == "Wrap up"
+
+def test_questions_reordered(store):
+    d = diff_of(store, edited(lambda secs: secs[0]["questions"].reverse()))
+    assert d["reordered"] == ["About you"]
+    assert summarize_diff(d) == ["Questions reordered in About you"]
+
+def test_question_moved_between_sections(store):
+    def change(secs):
+        secs[1]["questions"].append(secs[0]["questions"].pop(2))
+    d = diff_of(store, edited(change))
+    assert d["moved"] == [{"id": "Q3", "from": "About you", "to": "Commute"}]
+    assert d["added"] == [] and d["removed"] == [] and d["reordered"] == []
+    assert summarize_diff(d) == ["Q3 moved: About you → Commute"]
+
+def test_moved_into_renamed_section(store):
+    def change(secs):
+        secs[1]["title"] = "Travel"
+        secs[1]["questions"].insert(0, secs[0]["questions"].pop(0))
+    d = diff_of(store, edited(change))
+    assert d["moved"] == [{"id": "Q1", "from": "About you", "to": "Travel"}]
+    #Q4 / Q5 stay in the renamed section in the same order
+    assert d["reordered"] == []
+
+def test_sections_reordered(store):
+    d = diff_of(store, edited(lambda secs: secs.reverse()))
+    assert d["sections_reordered"] is True
+    assert summarize_diff(d) == ["Sections reordered"]